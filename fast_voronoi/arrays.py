@@ -0,0 +1,122 @@
+import numpy as np
+from copy import copy
+from math import ceil
+from typing import Iterable
+
+from .classes.v2 import v2
+from .classes.cell import Cell
+from .classes.bounds import Bounds
+from .classes.options import Options
+from .classes.cell_array import CellArray
+
+from .polygons import Cache, iter_polygons
+
+
+def line_array(P: v2, Q: v2, options: Options) -> np.ndarray:
+    """
+    Same as Cache.line_points, as an array of shape (N, 2)
+    """
+
+    if not options.divide_lines:
+        return np.array(((P.x, P.y), (Q.x, Q.y)), dtype=np.float64)
+
+    dx, dy = Q.x-P.x, Q.y-P.y
+    N = ceil(v2(dx, dy).length() * options.segments_density)
+    if not N:
+        N = 1
+
+    t = np.arange(N+1) / N
+
+    return np.stack((P.x + dx*t, P.y + dy*t), axis=1)
+
+
+def polygon_array(corners: list[v2], options: Options) -> np.ndarray:
+    """
+    Turns the corners of a polygon with only straight edges into an array of
+    shape (N, 2), following the options like Cache.build_polygon
+    """
+
+    if options.divide_lines:
+        edges = [line_array(X, corners[(k+1) % len(corners)], options)[:-1]
+                 for k, X in enumerate(corners)]
+        polygon = np.concatenate(edges) if edges else np.empty((0, 2))
+
+    else:
+        polygon = np.array([(X.x, X.y) for X in corners],
+                           dtype=np.float64).reshape(-1, 2)
+
+    if options.complete_polygons and len(polygon):
+        polygon = np.concatenate((polygon, polygon[:1]))
+
+    return polygon
+
+
+class ArrayCache(Cache):
+    """
+    Cache producing polygons as NumPy arrays of shape (N, 2) instead of lists
+    of v2, sampling every edge at once
+    """
+
+    def line_points(self, P: v2, Q: v2) -> np.ndarray:
+        return line_array(P, Q, self.options)
+
+    def arc_points(self, c: v2, radius: float, a1: float, a2: float, N: int
+                   ) -> np.ndarray:
+        a = a1 + (a2-a1)*np.arange(N+1)/N
+
+        return np.stack((c.x + np.cos(a)*radius, c.y + np.sin(a)*radius),
+                        axis=1)
+
+    def join_points(self, edges: list[np.ndarray], complete_polygon: bool
+                    ) -> np.ndarray:
+        if complete_polygon:
+            edges = edges + [edges[0][:1]]
+
+        return np.concatenate(edges)
+
+
+def flat_polygons(polygons: Iterable[tuple[int, list[v2]]],
+                  dtype=np.float64) -> tuple[np.ndarray, np.ndarray,
+                                             np.ndarray]:
+    """
+    Packs polygons like the ones of make_polygons into three arrays:
+    - the vertices of all the polygons one after the other, with shape
+    (V, 2) and the given float dtype
+    - offsets, with shape (P+1,), such that the vertices of the polygon k are
+    vertices[offsets[k]:offsets[k+1]]
+    - the index of the cell of every polygon, with shape (P,)
+    """
+
+    arrays = []
+    indices = []
+
+    for m, polygon in polygons:
+        if not isinstance(polygon, np.ndarray):
+            polygon = np.array([(X.x, X.y) for X in polygon],
+                               dtype=np.float64).reshape(-1, 2)
+
+        arrays.append(polygon)
+        indices.append(m)
+
+    offsets = np.zeros(len(arrays)+1, dtype=np.int64)
+    np.cumsum([len(polygon) for polygon in arrays], out=offsets[1:])
+
+    vertices = np.concatenate(arrays).astype(dtype, copy=False) if arrays \
+        else np.empty((0, 2), dtype=dtype)
+
+    return vertices, offsets, np.array(indices, dtype=np.int64)
+
+
+def make_flat_polygons(options: Options, bounds: Bounds,
+                       cells: list[Cell] | CellArray, dtype=np.float64
+                       ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Same as make_polygons, returning the polygons packed by flat_polygons,
+    in the same order. Edges are sampled as arrays whatever the numpy_output
+    option, and no v2 object is created for the vertices.
+    """
+
+    array_options = copy(options)
+    array_options.numpy_output = True
+
+    return flat_polygons(iter_polygons(array_options, bounds, cells), dtype)
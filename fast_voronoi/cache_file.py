@@ -0,0 +1,153 @@
+import os
+import sys
+import mmap
+import struct
+import hashlib
+from array import array
+from typing import Sequence
+
+from .classes.v2 import v2
+from .classes.cell import Cell
+from .classes.bounds import Bounds
+from .classes.intersection import Intersection
+
+# start of every file, the format version and the byte order of the arrays
+magic = b'FVTOPO1' + (b'L' if sys.byteorder == 'little' else b'B')
+
+# magic, key, then the number of cells, neighbor relations and intersections
+header = struct.Struct('=8s32s3q')
+
+
+class Topology:
+    """
+    The part of a Cache that does not depend on the options, read from a
+    file (see load_topology) to be used instead of computing it again.
+    radii and the rows of neighbors are read-only views of the file.
+    """
+
+    def __init__(self, radii: Sequence[float],
+                 neighbors: list[Sequence[int]],
+                 intersections: list[Intersection]):
+        self.radii = radii
+        self.neighbors = neighbors
+        self.intersections = intersections
+
+
+def topology_key(bounds: Bounds, cells: list[Cell]) -> bytes:
+    """
+    Hash of the bounds and of the positions and weights of the cells, which
+    are all the topology depends on
+    """
+
+    data = [bounds.x, bounds.y, bounds.w, bounds.h]
+    for cell in cells:
+        data += (cell.pos.x, cell.pos.y, cell.weight)
+
+    return hashlib.sha256(struct.pack(f'<{len(data)}d', *data)).digest()
+
+
+def topology_path(directory: str, key: bytes) -> str:
+    return os.path.join(directory, key.hex() + '.topo')
+
+
+def save_topology(path: str, key: bytes, cache) -> None:
+    """
+    Writes the radii, neighbors and intersections of a cache as flat arrays
+    of 64 bits integers and floats after a small header, so that the file
+    can be mapped in memory and read without parsing it:
+    - radii: n floats
+    - neighbors: n+1 offsets, then the neighbors of all the cells
+    - intersections: their positions as (x, y), then their three cells
+    The directory is created when missing, and the file is written next to
+    its final path then renamed, so that other processes never read a
+    partial file.
+    """
+
+    n = len(cache.cells)
+
+    offsets = array('q', [0])
+    neighbors = array('q')
+    for row in cache.neighbors:
+        neighbors.extend(row)
+        offsets.append(len(neighbors))
+
+    positions = array('d')
+    inter_cells = array('q')
+    for inter in cache.intersections:
+        positions.extend((inter.pos.x, inter.pos.y))
+        inter_cells.extend(sorted(inter.cells))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as file:
+        file.write(header.pack(magic, key, n, len(neighbors),
+                               len(cache.intersections)))
+
+        for data in (array('d', cache.radii), offsets, neighbors, positions,
+                     inter_cells):
+            data.tofile(file)
+
+    os.replace(temp, path)
+
+
+def load_topology(path: str, key: bytes) -> Topology | None:
+    """
+    Reads a file written by save_topology through a read-only memory map,
+    shared with the other processes reading it. The radii and neighbors stay
+    in the map, only the intersections are turned into objects.
+    Returns None when the file is missing, empty, truncated, or was made for
+    other cells or with another format.
+    """
+
+    try:
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # ValueError: empty file, which cannot be mapped
+        return None
+
+    if len(data) < header.size:
+        data.close()
+        return None
+
+    found_magic, found_key, n, count, inters = header.unpack_from(data)
+    if found_magic != magic or found_key != key or \
+            min(n, count, inters) < 0:
+        data.close()
+        return None
+
+    view = memoryview(data)[header.size:]
+    try:
+        floats, ints = view.cast('d'), view.cast('q')
+    except TypeError:
+        view.release()
+        data.close()
+        return None
+
+    # position of every array, in 64 bits items
+    sections = [n, n+1, count, 2*inters, 3*inters]
+    starts = [sum(sections[:k]) for k in range(len(sections)+1)]
+
+    offsets = ints[starts[1]:starts[2]]
+    if len(ints) != starts[-1] or offsets[0] != 0 or offsets[n] != count or \
+            any(offsets[i] > offsets[i+1] for i in range(n)):
+        for buffer in (offsets, floats, ints, view):
+            buffer.release()
+        data.close()
+        return None
+
+    # the views keep the map open for as long as the cache uses them
+    flat = ints[starts[2]:starts[3]]
+    neighbors = [flat[offsets[i]:offsets[i+1]] for i in range(n)]
+
+    positions = floats[starts[3]:starts[4]]
+    inter_cells = ints[starts[4]:starts[5]]
+    intersections = [
+        Intersection(v2(positions[2*k], positions[2*k+1]),
+                     set(inter_cells[3*k:3*k+3]))
+        for k in range(inters)]
+
+    return Topology(floats[starts[0]:starts[1]], neighbors, intersections)
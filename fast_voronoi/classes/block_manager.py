@@ -1,40 +1,58 @@
 from abc import abstractmethod
-from math import ceil, tau
+from bisect import bisect_left, bisect_right
+from math import floor, tau
 
 from ..utils import smol
 
 from .line import Line
+from .stats import Stats
 from .bounds import Bounds
 
 
 class BlockManager:
+    """
+    Keeps track of blocked ranges as a sorted list of disjoint blocks
+    """
+
     def __init__(self):
         self.blocks: list[tuple[float, float]] = []
         self.is_blocked = False
 
     @abstractmethod
-    def merge_inner(self) -> bool:
-        """returns True if merged something, False otherwise"""
-        return False
-
-    @abstractmethod
-    def check_blocked(self):
-        """updates self.is_blocked"""
+    def add_block(self, block: tuple[float, float]):
+        """adds a block and updates self.is_blocked"""
         pass
 
-    def merge(self):
-        while self.merge_inner():
-            pass
+    def insert(self, t0: float, t1: float) -> tuple[float, float]:
+        """
+        Adds the block (t0, t1), merging it with the blocks it collides with,
+        and returns the resulting block
+        """
 
-        self.check_blocked()
+        # find the range of blocks colliding with the new one, using the fact
+        # that both their starts and their ends are sorted
+        start = bisect_left(self.blocks, t0, key=lambda block: block[1])
+        stop = bisect_right(self.blocks, t1, key=lambda block: block[0])
 
-    def add_block(self, block):
-        self.blocks.append(block)
+        if start < stop:
+            t0 = min(t0, self.blocks[start][0])
+            t1 = max(t1, self.blocks[stop-1][1])
 
-        self.merge()
+            if Stats.active is not None:
+                Stats.active.count('block_merges', stop-start)
+
+        self.blocks[start:stop] = [(t0, t1)]
+
+        return t0, t1
 
 
 class StraightBlockManager(BlockManager):
+    """
+    Keeps track of the blocked ranges of a line, as a sorted list of disjoint
+    blocks clipped to the part of the line inside the bounds, so that adding
+    a block only touches the blocks it overlaps.
+    """
+
     def __init__(self, line: Line, box: Bounds):
         super().__init__()
 
@@ -60,30 +78,16 @@ class StraightBlockManager(BlockManager):
         else:
             self.min, self.max = sorted(bounds[2:])
 
-    def merge_inner(self) -> bool:
-        for i, block1 in enumerate(self.blocks):
-            for j, block2 in enumerate(self.blocks):
-                if i == j:
-                    continue
+    def add_block(self, block: tuple[float, float]):
+        # only the part of the block inside the bounds matters
+        t0, t1 = max(block[0], self.min), min(block[1], self.max)
+        if t0 > t1:
+            return
 
-                a0, a1 = block1[0], block1[1]
-                b0, b1 = block2[0], block2[1]
+        t0, t1 = self.insert(t0, t1)
 
-                # collision
-                if a0 <= b1 and a1 >= b0:
-                    self.blocks[i] = (min(a0, b0), max(a1, b1))
-                    self.blocks.pop(j)
-                    return True
-
-        return False
-
-    def check_blocked(self):
-        for block in self.blocks:
-            if block[0] <= self.min and block[1] >= self.max:
-                self.is_blocked = True
-                return
-
-        self.is_blocked = False
+        # the line is blocked once a single block covers it
+        self.is_blocked = t0 <= self.min and t1 >= self.max
 
     def block_min(self, t):
         self.add_block((self.min, t))
@@ -93,36 +97,35 @@ class StraightBlockManager(BlockManager):
 
 
 class CircleBlockManager(BlockManager):
-    def __init__(self):
-        super().__init__()
-
-    def merge_inner(self) -> bool:
-        for i, block1 in enumerate(self.blocks):
-            for j, block2 in enumerate(self.blocks):
-                if i == j:
-                    continue
-
-                a0, a1 = block1[0], block1[1]
-                b0, b1 = block2[0], block2[1]
-
-                # shift b to be right after a in angle, to avoid modulo issues
-                offset = ceil((a0-b0) / tau) * tau
-                b0 += offset
-                b1 += offset
-
-                # merging occurs
-                if a0 <= b0 <= a1:
-                    self.blocks[i] = (a0, max(a1, b1))
-                    self.blocks.pop(j)
-
-                    return True
-
-        return False
-
-    def check_blocked(self):
-        for block in self.blocks:
-            if block[1] - block[0] >= tau:
-                self.is_blocked = True
-                return
+    """
+    Keeps track of the blocked arcs of a circle, as angle ranges inside
+    [0, tau]. Blocks crossing the 0/tau seam are split in two, so that the
+    circle is blocked exactly when a single block spans [0, tau].
+    """
+
+    def add_block(self, block: tuple[float, float]):
+        a0, a1 = block
+        if a1 < a0:
+            return
+
+        if a1-a0 >= tau:
+            self.blocks = [(0, tau)]
+            self.is_blocked = True
+            return
+
+        # shift the block so that it starts inside [0, tau]
+        offset = floor(a0 / tau) * tau
+        a0 -= offset
+        a1 -= offset
+
+        if a0 < 0:
+            self.insert(a0+tau, tau)
+            self.insert(0, a1)
+        elif a1 > tau:
+            self.insert(a0, tau)
+            self.insert(0, a1-tau)
+        else:
+            self.insert(a0, a1)
 
-        self.is_blocked = False
+        b0, b1 = self.blocks[0]
+        self.is_blocked = b0 <= 0 and b1 >= tau
@@ -0,0 +1,135 @@
+from array import array
+
+import numpy as np
+
+from ..utils import smol
+
+from .v2 import v2
+from .cell import Cell
+
+# largest number of pairs whose edges are all computed at once, which
+# takes 32 bytes per pair in the table, and a few times more while
+# computing it
+max_table_pairs = 1 << 20
+
+
+class CellArray:
+    """
+    Cells stored as NumPy arrays: positions with shape (n, 2) and weights with
+    shape (n,), both float64. Can be used instead of a list of cells, and
+    allows computing the edges between many pairs of cells at once.
+    Requires NumPy, which the rest of the package does not depend on.
+    """
+
+    def __init__(self, positions, weights=None):
+        self.positions = np.array(positions, dtype=np.float64).reshape(-1, 2)
+
+        if weights is None:
+            self.weights = np.ones(len(self.positions))
+        else:
+            self.weights = np.array(weights, dtype=np.float64).reshape(-1)
+
+        if len(self.weights) != len(self.positions):
+            raise ValueError('CellArray needs as many weights as positions')
+
+        # Cell objects, created on demand
+        self.cells: list[Cell] | None = None
+
+    @classmethod
+    def from_cells(cls, cells: list[Cell]):
+        return cls([(cell.pos.x, cell.pos.y) for cell in cells],
+                   [cell.weight for cell in cells])
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, i: int) -> Cell:
+        return self.to_cells()[i]
+
+    def __iter__(self):
+        return iter(self.to_cells())
+
+    def to_cells(self) -> list[Cell]:
+        """
+        returns the cells as a list of Cell objects
+        """
+
+        if self.cells is None:
+            self.cells = [Cell(v2(x, y), w) for (x, y), w in zip(
+                self.positions.tolist(), self.weights.tolist())]
+
+        return self.cells
+
+    def edge_arrays(self, i, j) -> tuple[np.ndarray, np.ndarray,
+                                         np.ndarray, np.ndarray]:
+        """
+        Computes the edges between the cells at indices i and the cells at
+        indices j, with the same formulas as utils.perp_bisector and
+        utils.get_circle.
+        Returns an array telling which edges are lines, then the points M of
+        the lines or centers of the circles, the directions u of the lines
+        and the squared radii of the circles (zero for the other kind).
+        """
+
+        i, j = np.asarray(i, dtype=np.intp), np.asarray(j, dtype=np.intp)
+
+        A, B = self.positions[i], self.positions[j]
+        wa, wb = self.weights[i], self.weights[j]
+        is_line = np.abs(wa - wb) < smol
+
+        points = np.empty(A.shape)
+        u = np.zeros(A.shape)
+        r2 = np.zeros(len(i))
+
+        # perpendicular bisectors
+        Al, Bl = A[is_line], B[is_line]
+        d = Bl - Al
+        dist_inv = 1 / np.sqrt(d[:, 0]*d[:, 0] + d[:, 1]*d[:, 1])
+
+        points[is_line] = (Al+Bl) * .5
+        u[is_line] = np.stack((d[:, 1]*dist_inv, -d[:, 0]*dist_inv), axis=1)
+
+        # circles, see utils.get_circle for the details
+        is_circle = ~is_line
+        Ac, Bc = A[is_circle], B[is_circle]
+        wa2, wb2 = wa[is_circle]*wa[is_circle], wb[is_circle]*wb[is_circle]
+
+        a = wa2 - wb2
+        b = 2 * (Bc*wb2[:, None] - Ac*wa2[:, None])
+        c = wa2[:, None]*Ac*Ac - wb2[:, None]*Bc*Bc
+
+        alpha = b / (2*a[:, None])
+        gamma = c/a[:, None] - alpha*alpha
+
+        points[is_circle] = -alpha
+        r2[is_circle] = -gamma[:, 0]-gamma[:, 1]
+
+        return is_line, points, u, r2
+
+    def edge_table(self, i, j) -> array:
+        """
+        Same as edge_arrays, with the edges stored like in EdgeStore, as
+        (mx, my, ux, uy) or (cx, cy, r2, 0) for every pair, one after the
+        other in a single array of floats (see EdgeStore.load)
+        """
+
+        is_line, points, u, r2 = self.edge_arrays(i, j)
+
+        table = np.empty((len(points), 4))
+        table[:, :2] = points
+        table[:, 2:] = u
+        table[~is_line, 2] = r2[~is_line]
+
+        return array('d', table.tobytes())
+
+    def all_edge_table(self) -> array | None:
+        """
+        Same as edge_table for all the pairs of cells (i, j), i < j, sorted
+        by i then j, or None when there are more than max_table_pairs
+        """
+
+        n = len(self)
+        if n*(n-1) // 2 > max_table_pairs:
+            return None
+
+        return self.edge_table(*np.triu_indices(n, 1))
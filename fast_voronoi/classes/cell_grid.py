@@ -0,0 +1,240 @@
+from math import sqrt
+
+from .v2 import v2
+from .cell import Cell
+from .stats import Stats
+
+
+class CellGrid:
+    """
+    Uniform grid bucketing cells by position, used to find the closest cell
+    to a point (taking weights into account) without looking at all of them.
+    Buckets are visited in rings around the queried point, and the search
+    stops once no unvisited cell can be closer than the best one found, using
+    the smallest weight as a conservative bound.
+    """
+
+    def __init__(self, cells: list[Cell]):
+        # cells positions, weights and indices, grouped by bucket
+        self.buckets: dict[tuple[int, int],
+                           list[tuple[float, float, float, int]]] = {}
+
+        # smallest weight, any cell at a distance d is at least
+        # min_weight*d away from a point when weights are taken into account
+        self.min_weight = min((cell.weight for cell in cells), default=1)
+
+        if cells:
+            xs = [cell.pos.x for cell in cells]
+            ys = [cell.pos.y for cell in cells]
+            self.x0, self.y0 = min(xs), min(ys)
+            w, h = max(xs)-self.x0, max(ys)-self.y0
+        else:
+            self.x0 = self.y0 = 0
+            w = h = 0
+
+        # aim for about two cells per bucket, even when all cells are aligned
+        n = len(cells) or 1
+        self.size = max(sqrt(2*w*h / n), max(w, h) / n) or 1
+
+        # range of used bucket coordinates
+        self.bx0 = self.by0 = 0
+        self.bx1, self.by1 = int(w // self.size), int(h // self.size)
+
+        for i, cell in enumerate(cells):
+            self.buckets.setdefault(self.bucket(cell.pos), []).append(
+                    (cell.pos.x, cell.pos.y, cell.weight, i))
+
+    def add(self, i: int, cell: Cell):
+        """
+        Adds a cell at index i, growing the range of buckets when it is
+        outside of it
+        """
+
+        bx = int((cell.pos.x-self.x0) // self.size)
+        by = int((cell.pos.y-self.y0) // self.size)
+
+        self.bx0, self.bx1 = min(self.bx0, bx), max(self.bx1, bx)
+        self.by0, self.by1 = min(self.by0, by), max(self.by1, by)
+
+        self.buckets.setdefault((bx, by), []).append(
+                (cell.pos.x, cell.pos.y, cell.weight, i))
+
+        # only ever decreases, a smaller bound stays valid
+        self.min_weight = min(self.min_weight, cell.weight)
+
+    def remove(self, i: int, cell: Cell):
+        """
+        Removes the cell at index i, which was at cell.pos
+        """
+
+        key = self.bucket(cell.pos)
+        bucket = self.buckets[key]
+
+        bucket[:] = [item for item in bucket if item[3] != i]
+        if not bucket:
+            del self.buckets[key]
+
+    def move(self, i: int, old: Cell, new: Cell):
+        """
+        Replaces the cell at index i, which was at old.pos, with new
+        """
+
+        self.remove(i, old)
+        self.add(i, new)
+
+    def pop(self, i: int, cell: Cell):
+        """
+        Removes the cell at index i and shifts the indices of the following
+        cells down by one, like list.pop
+        """
+
+        self.remove(i, cell)
+
+        for bucket in self.buckets.values():
+            bucket[:] = [(x, y, w, k - (k > i)) for x, y, w, k in bucket]
+
+    def bucket(self, pos: v2) -> tuple[int, int]:
+        """
+        returns the coordinates of the bucket closest to a point
+        """
+
+        bx = int((pos.x-self.x0) // self.size)
+        by = int((pos.y-self.y0) // self.size)
+
+        return (min(max(bx, self.bx0), self.bx1),
+                min(max(by, self.by0), self.by1))
+
+    def ring(self, bx: int, by: int, k: int) -> list[tuple[int, int]]:
+        """
+        returns the buckets at a Chebyshev distance k around (bx, by)
+        that can hold cells
+        """
+
+        if not k:
+            return [(bx, by)]
+
+        x0, x1 = max(bx-k, self.bx0), min(bx+k, self.bx1)
+        y0, y1 = max(by-k+1, self.by0), min(by+k-1, self.by1)
+
+        ring = []
+        for y in (by-k, by+k):
+            if self.by0 <= y <= self.by1:
+                ring += [(x, y) for x in range(x0, x1+1)]
+        for x in (bx-k, bx+k):
+            if self.bx0 <= x <= self.bx1:
+                ring += [(x, y) for y in range(y0, y1+1)]
+
+        return ring
+
+    def unvisited_dist(self, pos: v2, bx: int, by: int, k: int) -> float:
+        """
+        returns a lower bound of the distance between a point and the buckets
+        not yet visited after k rings around (bx, by), or -1 when all of them
+        have been visited
+        """
+
+        dist = -1.
+        size = self.size
+
+        for far, d in ((bx-k > self.bx0, pos.x - self.x0 - (bx-k)*size),
+                       (bx+k < self.bx1, self.x0 + (bx+k+1)*size - pos.x),
+                       (by-k > self.by0, pos.y - self.y0 - (by-k)*size),
+                       (by+k < self.by1, self.y0 + (by+k+1)*size - pos.y)):
+            if far and (dist == -1 or d < dist):
+                dist = d
+
+        return max(dist, 0) if dist != -1 else -1
+
+    def closest(self, pos: v2, exclude: int = -1) -> int:
+        """
+        returns the index of the closest cell to a point, taking their weight
+        into account, optionally ignoring the cell at index exclude.
+        Same result as utils.closest_cell, ties going to the smallest index.
+        """
+
+        if Stats.active is not None:
+            Stats.active.count('closest_cell')
+
+        bx, by = self.bucket(pos)
+        x, y = pos.x, pos.y
+        closest = 0.
+        closest_i = -1
+
+        k = 0
+        while True:
+            for key in self.ring(bx, by, k):
+                for cx, cy, w, i in self.buckets.get(key, ()):
+                    if i == exclude:
+                        continue
+
+                    dx = (cx-x) * w
+                    dy = (cy-y) * w
+                    dist = dx*dx + dy*dy
+
+                    if closest_i == -1 or dist < closest or \
+                            dist == closest and i < closest_i:
+                        closest = dist
+                        closest_i = i
+
+            bound = self.unvisited_dist(pos, bx, by, k)
+            if bound == -1:
+                break
+
+            bound *= self.min_weight
+            if closest_i != -1 and closest < bound*bound:
+                break
+
+            k += 1
+
+        return closest_i
+
+    def nearest(self, pos: v2, count: int, exclude: int = -1) -> list[int]:
+        """
+        returns the indices of the count closest cells to a point, closest
+        first, ignoring weights and optionally the cell at index exclude
+        """
+
+        bx, by = self.bucket(pos)
+        x, y = pos.x, pos.y
+        found: list[tuple[float, int]] = []
+
+        k = 0
+        while True:
+            for key in self.ring(bx, by, k):
+                for cx, cy, _, i in self.buckets.get(key, ()):
+                    if i != exclude:
+                        found.append(((cx-x)*(cx-x) + (cy-y)*(cy-y), i))
+
+            bound = self.unvisited_dist(pos, bx, by, k)
+            if bound == -1:
+                break
+
+            if len(found) >= count:
+                found.sort()
+                if found[count-1][0] < bound*bound:
+                    break
+
+            k += 1
+
+        found.sort()
+        return [i for _, i in found[:count]]
+
+    def within(self, pos: v2, radius: float) -> list[int]:
+        """
+        returns the indices of the cells at most radius away from a point,
+        ignoring weights
+        """
+
+        bx0, by0 = self.bucket(v2(pos.x-radius, pos.y-radius))
+        bx1, by1 = self.bucket(v2(pos.x+radius, pos.y+radius))
+        x, y = pos.x, pos.y
+        r2 = radius*radius
+
+        found = []
+        for bx in range(bx0, bx1+1):
+            for by in range(by0, by1+1):
+                for cx, cy, _, i in self.buckets.get((bx, by), ()):
+                    if (cx-x)*(cx-x) + (cy-y)*(cy-y) <= r2:
+                        found.append(i)
+
+        return found
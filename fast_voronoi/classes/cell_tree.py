@@ -0,0 +1,80 @@
+from .v2 import v2
+from .cell import Cell
+
+# most cells kept in a single leaf of the tree
+leaf_size = 8
+
+
+class CellTree:
+    """
+    k-d tree of the positions of cells, used to find cells closer to a point
+    than a given distance, ignoring weights.
+    Unlike CellGrid, the cost of a query does not depend on how evenly the
+    cells are spread, which matters for cells along a line. The tree is only
+    built on the first query.
+    """
+
+    def __init__(self, cells: list[Cell]):
+        self.cells = cells
+        self.root: list | None = None
+
+    def build(self, items: list[tuple[float, float, int]]) -> list:
+        """
+        returns the node holding items, as [x0, y0, x1, y1, left, right,
+        axis, split], leaves holding their items in left and None in right
+        """
+
+        xs = [x for x, _, _ in items]
+        ys = [y for _, y, _ in items]
+        x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+
+        if len(items) <= leaf_size:
+            return [x0, y0, x1, y1, items, None, 0, 0.]
+
+        # split along the longest side of the box
+        axis = 0 if x1-x0 >= y1-y0 else 1
+        items.sort(key=lambda item: item[axis])
+        mid = len(items) // 2
+
+        return [x0, y0, x1, y1, self.build(items[:mid]),
+                self.build(items[mid:]), axis, items[mid][axis]]
+
+    def closest_within(self, pos: v2, dist2: float, skip: set[int]) -> int:
+        """
+        returns the index of the closest cell to a point among the ones
+        strictly closer than sqrt(dist2), ignoring weights and the indices
+        in skip, or -1 when there are none
+        """
+
+        if self.root is None:
+            if not self.cells:
+                return -1
+            self.root = self.build([(cell.pos.x, cell.pos.y, i)
+                                    for i, cell in enumerate(self.cells)])
+
+        x, y = pos.x, pos.y
+        best = -1
+        stack = [self.root]
+
+        while stack:
+            x0, y0, x1, y1, left, right, axis, split = stack.pop()
+
+            dx = max(x0-x, 0, x-x1)
+            dy = max(y0-y, 0, y-y1)
+            if dx*dx + dy*dy >= dist2:
+                continue
+
+            if right is None:
+                for cx, cy, i in left:
+                    d = (cx-x)*(cx-x) + (cy-y)*(cy-y)
+                    if d < dist2 and i not in skip:
+                        dist2 = d
+                        best = i
+
+            # visit the side of the point first, to shrink dist2 sooner
+            elif (x if axis == 0 else y) < split:
+                stack += (right, left)
+            else:
+                stack += (left, right)
+
+        return best
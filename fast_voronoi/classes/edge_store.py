@@ -0,0 +1,153 @@
+from array import array
+
+from .v2 import v2
+from .cell import Cell
+from .line import Line
+from .circle import Circle
+
+from ..utils import smol, perp_bisector_xy, get_circle_xy
+
+
+class EdgeStore:
+    """
+    Edges between pairs of cells, their perpendicular bisector if they have
+    the same weight or their circle otherwise, computed on demand and at most
+    once per unordered pair of cells, so that all the steps of the polygon
+    creation can share them.
+    Lines are stored as (mx, my, ux, uy), directed from the cell with the
+    smallest index, and circles as (cx, cy, r2). The circle between two cells
+    does not depend on their order, and swapping them only flips u.
+    Keys do not depend on the number of cells, so that cells can be added
+    to the list afterwards.
+    Edges computed in bulk (see load) stay in a flat array of floats, and
+    are read from it the first time they are needed.
+    """
+
+    def __init__(self, cells: list[Cell]):
+        self.cells = cells
+
+        self.edges: dict[int, tuple[float, ...]] = {}
+        # Circle objects, created on demand
+        self.circles: dict[int, Circle] = {}
+
+        # edges given to load, 4 floats per pair, and the row of every pair,
+        # None when the table holds all the pairs (see row)
+        self.table = array('d')
+        self.rows: dict[int, int] | None = {}
+        # number of cells when all the pairs were loaded
+        self.size = 0
+
+    def key(self, i: int, j: int) -> int:
+        return i << 32 | j if i < j else j << 32 | i
+
+    def forget(self, i: int):
+        """
+        Removes the edges of the cell at index i, after it changed
+        """
+
+        for j in range(len(self.cells)):
+            key = self.key(i, j)
+            self.edges.pop(key, None)
+            self.circles.pop(key, None)
+
+        # the rows of a table holding all the pairs cannot be removed one by
+        # one, compute the edges that were not read yet again instead
+        if self.rows is None:
+            self.rows = {}
+        else:
+            for j in range(len(self.cells)):
+                self.rows.pop(self.key(i, j), None)
+
+    def load(self, table: array, i: list[int] | None = None,
+             j: list[int] | None = None):
+        """
+        Stores the edges computed elsewhere between the cells at indices i
+        and j, i < j, given as (mx, my, ux, uy) or (cx, cy, r2, 0) for every
+        pair one after the other (see CellArray.edge_table). Without i and j,
+        the table holds all the pairs, sorted by i then j.
+        """
+
+        self.table = table
+
+        if i is None or j is None:
+            self.rows = None
+            self.size = len(self.cells)
+        else:
+            self.rows = {self.key(a, b): row
+                         for row, (a, b) in enumerate(zip(i, j))}
+
+    def row(self, i: int, j: int) -> int | None:
+        """
+        returns the row of the pair (i, j), i < j, in the loaded table, or
+        None when it was not loaded
+        """
+
+        if self.rows is not None:
+            return self.rows.get(self.key(i, j))
+
+        n = self.size
+        if j >= n:
+            return None
+
+        return i*(2*n-i-1)//2 + j-i-1
+
+    def edge(self, i: int, j: int) -> tuple[float, ...]:
+        key = self.key(i, j)
+
+        edge = self.edges.get(key)
+        if edge is None:
+            if i > j:
+                i, j = j, i
+            A, B = self.cells[i], self.cells[j]
+            is_line = abs(A.weight - B.weight) < smol
+
+            row = self.row(i, j)
+            if row is not None:
+                k = 4*row
+                edge = tuple(self.table[k:k+4] if is_line
+                             else self.table[k:k+3])
+
+            elif is_line:
+                edge = perp_bisector_xy(A.pos.x, A.pos.y, B.pos.x, B.pos.y)
+            else:
+                edge = get_circle_xy(A.pos.x, A.pos.y, A.weight,
+                                     B.pos.x, B.pos.y, B.weight)
+
+            self.edges[key] = edge
+
+        return edge
+
+    def line(self, i: int, j: int) -> tuple[float, float, float, float]:
+        """
+        Same as utils.perp_bisector_xy for the cells at indices i and j
+        """
+
+        mx, my, ux, uy = self.edge(i, j)
+
+        if i > j:
+            return mx, my, -ux, -uy
+        return mx, my, ux, uy
+
+    def circle(self, i: int, j: int) -> tuple[float, float, float]:
+        """
+        Same as utils.get_circle_xy for the cells at indices i and j
+        """
+
+        return self.edge(i, j)
+
+    def get(self, i: int, j: int) -> Line | Circle:
+        """
+        Returns the edge between the cells at indices i and j as a Line or
+        a Circle
+        """
+
+        if abs(self.cells[i].weight - self.cells[j].weight) < smol:
+            mx, my, ux, uy = self.line(i, j)
+            return Line(v2(mx, my), v2(ux, uy))
+
+        key = self.key(i, j)
+        if key not in self.circles:
+            cx, cy, r2 = self.edge(i, j)
+            self.circles[key] = Circle(v2(cx, cy), r2)
+
+        return self.circles[key]
@@ -1,10 +1,11 @@
 from .v2 import v2
-from .cell import Cell
 
 
 class Intersection:
-    def __init__(self, pos: v2, cells: set[Cell]):
+    def __init__(self, pos: v2, cells: set[int]):
         self.pos = pos
+        # indices of the cells meeting at this point, the fake cells used for
+        # the bounds coming right after the real cells
         self.cells = cells
 
     def __eq__(self, other):
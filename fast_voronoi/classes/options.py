@@ -1,3 +1,8 @@
+from os import PathLike
+
+from .stats import Stats
+
+
 class Options:
     def __init__(self, **kwargs):
         """
@@ -8,16 +13,47 @@ class Options:
             something like Pygame where the unit of space is a pixel, or a
             number greater than 1 when something like Manim is used.
 
+        param arc_error: when not 0, curved lines are instead subdivided so
+            that the segments are at most this far from the arc they replace
+            (their sagitta), which puts fewer points on large flat arcs and
+            more on tight ones.
+
+        param max_arc_points: when not 0, the largest number of segments to
+            subdivide a single curved line into.
+
         param divide_lines: whether to subdivide straight portions of the
             polygons the same way, useful when using this package with Manim.
 
         param complete_polygons: whether to make polygons start and end on the
             same point.
+
+        param numpy_output: whether to return polygons as NumPy arrays of
+            shape (N, 2) instead of lists of v2, in which case edges are
+            sampled in a vectorized way. Requires NumPy.
+
+        param workers: how many processes to use to find the neighbors of the
+            cells and build their polygons, 1 to stay in the current process,
+            or 0 to use all the available cores.
+
+        param cache_dir: directory where the neighbors and intersections of
+            the cells are saved, in files named after a hash of the cells and
+            bounds, and read back instead of being computed again for the
+            same cells. None to always compute them.
+
+        param stats: a Stats object filled with the time spent in every stage
+            and counters of what happened, see classes/stats.py. None to not
+            measure anything.
         """
 
         self.segments_density = .1
+        self.arc_error = 0
+        self.max_arc_points = 0
         self.divide_lines = False
         self.complete_polygons = True
+        self.numpy_output = False
+        self.workers = 1
+        self.cache_dir = None
+        self.stats = None
 
         for option, value in kwargs.items():
             match option:
@@ -26,12 +62,48 @@ class Options:
                         raise TypeError('segments_density should be int|float')
                     self.segments_density = value
 
+                case 'arc_error':
+                    if type(value) not in [int, float]:
+                        raise TypeError('arc_error should be int|float')
+                    if value < 0:
+                        raise ValueError('arc_error should not be negative')
+                    self.arc_error = value
+
+                case 'max_arc_points':
+                    if type(value) is not int:
+                        raise TypeError('max_arc_points should be int')
+                    if value < 0:
+                        raise ValueError(
+                                'max_arc_points should not be negative')
+                    self.max_arc_points = value
+
                 case 'divide_lines':
                     self.divide_lines = bool(value)
 
                 case 'complete_polygons':
                     self.complete_polygons = bool(value)
 
+                case 'numpy_output':
+                    self.numpy_output = bool(value)
+
+                case 'workers':
+                    if type(value) is not int:
+                        raise TypeError('workers should be int')
+                    if value < 0:
+                        raise ValueError('workers should not be negative')
+                    self.workers = value
+
+                case 'cache_dir':
+                    if value is not None and \
+                            not isinstance(value, (str, PathLike)):
+                        raise TypeError('cache_dir should be str|PathLike')
+                    self.cache_dir = value
+
+                case 'stats':
+                    if value is not None and not isinstance(value, Stats):
+                        raise TypeError('stats should be Stats')
+                    self.stats = value
+
                 case _:
                     raise ValueError(
                             f'Options received an unknown keyword argument: {option}')
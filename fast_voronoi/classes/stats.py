@@ -0,0 +1,109 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Iterator
+
+
+class Stats:
+    """
+    Time spent in every stage of the polygon creation, and counters of what
+    happened during it, filled when given as the stats option.
+    Only one call out of every `every` is measured, so that it can stay
+    enabled without slowing every call down, and callback, when given,
+    receives the times and counters of every measured call. The totals of
+    all the measured calls are kept in times and counts.
+
+    Stages: neighbors, intersections, pairs, stitching, discretization, and
+    uniform when all the cells have the same weight.
+    Counters: is_neighbor and is_neighbor_early_exits, block_merges,
+    closest_cell, edge_cache_hits and edge_cache_misses, polygons and
+    vertices.
+    With several workers, only what happens in the current process is
+    measured.
+    """
+
+    # Stats of the call being measured, read by the functions that do not
+    # have access to the options. None most of the time, so that checking it
+    # is all they do when nothing is measured, and only set while the call
+    # runs, not while its caller does between two polygons (see run).
+    active: 'Stats | None' = None
+
+    def __init__(self, every: int = 1,
+                 callback: Callable[[dict[str, float], dict[str, int]], None]
+                 | None = None):
+        if type(every) is not int or every < 1:
+            raise ValueError('every should be a positive int')
+
+        self.every = every
+        self.callback = callback
+
+        # number of calls seen, and of calls measured
+        self.calls = 0
+        self.measured = 0
+
+        self.times: dict[str, float] = defaultdict(float)
+        self.counts: dict[str, int] = defaultdict(int)
+
+        # times and counters of the call being measured
+        self.call_times: dict[str, float] = defaultdict(float)
+        self.call_counts: dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def call(self):
+        """
+        Wraps a call to the polygon creation, yielding these stats when it
+        is measured and None otherwise
+        """
+
+        self.calls += 1
+        if (self.calls-1) % self.every:
+            yield None
+            return
+
+        self.call_times = defaultdict(float)
+        self.call_counts = defaultdict(int)
+
+        try:
+            yield self
+        finally:
+            self.measured += 1
+            for stage, seconds in self.call_times.items():
+                self.times[stage] += seconds
+            for name, count in self.call_counts.items():
+                self.counts[name] += count
+
+            if self.callback is not None:
+                self.callback(dict(self.call_times), dict(self.call_counts))
+
+    def run(self, iterator: Iterator) -> Iterator:
+        """
+        Yields the items of iterator, making these stats the active ones
+        while it runs only, so that the caller and other calls suspended in
+        between are not measured with it
+        """
+
+        while True:
+            previous = Stats.active
+            Stats.active = self
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                Stats.active = previous
+
+            yield item
+
+    def add_time(self, stage: str, start: float) -> float:
+        """
+        Adds the time since start to a stage, and returns the current time
+        to start the next one
+        """
+
+        now = perf_counter()
+        self.call_times[stage] += now-start
+
+        return now
+
+    def count(self, name: str, amount: int = 1):
+        self.call_counts[name] += amount
@@ -4,6 +4,8 @@ from math import sqrt
 
 
 class v2:
+    __slots__ = ('x', 'y')
+
     def __init__(self, x: float, y: float):
         self.x = x
         self.y = y
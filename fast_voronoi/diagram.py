@@ -0,0 +1,464 @@
+from bisect import insort
+from math import atan2, sqrt
+
+from .classes.v2 import v2
+from .classes.cell import Cell
+from .classes.bounds import Bounds
+from .classes.options import Options
+from .classes.intersection import Intersection
+
+from .neighbors import is_neighbor, reach_radius, in_reach, reach_samples
+from .intersections import triple_intersections, pair_bounds_intersections, \
+        corner_intersections, unique_intersections
+from .polygons import new_cache, build_cell, cell_polygons
+from .tiles import piece_cells, cutting_cells
+
+
+class Diagram:
+    """
+    Voronoi diagram that can be edited one cell at a time.
+    Instead of recomputing everything like make_polygons, edits only update
+    the neighbors, intersections and polygons around the edited cell, and
+    return the set of indices of the cells whose polygons changed.
+
+    An edit can only change the diagram where the edited cell is or was, so
+    only the pairs of cells that can both be the closest one to a point of a
+    small piece of these areas (see tiles.piece_cells) are looked at again,
+    along with the triples they form. The area of the cell before the edit
+    comes from its polygons, and the one after from its polygons among its
+    closest cells only, which can only be larger. The spatial index and the
+    edges are updated in place.
+
+    Removing a cell shifts the indices of the following cells down by one,
+    like list.pop. These cells are only reported if their polygons changed.
+    """
+
+    def __init__(self, options: Options, bounds: Bounds, cells: list[Cell]):
+        self.options = options
+        self.bounds = bounds
+
+        for cell in cells:
+            self.check(cell)
+
+        self.cells = list(cells)
+        self.rebuild()
+
+    def check(self, cell: Cell):
+        if not self.bounds.is_inside(cell.pos):
+            raise ValueError(f'Cell {cell} is outside the bounds')
+
+    def rebuild(self):
+        """
+        Recomputes the whole diagram
+        """
+
+        self.cache = new_cache(self.options, self.bounds, self.cells) \
+            if self.cells else None
+
+        # data read from the cache directory are read-only views of a file
+        if self.cache is not None and self.options.cache_dir is not None:
+            self.cache.radii = list(self.cache.radii)
+            self.cache.neighbors = [list(row) for row in self.cache.neighbors]
+
+        # polygons of every cell
+        self.polygons: list[list[list[v2]]] = []
+        for m in range(len(self.cells)):
+            self.polygons.append(build_cell(self.bounds, self.cache, m))
+
+        if self.cache is not None:
+            self.cache.edge_cache.clear()
+
+    def get_polygons(self) -> list[tuple[int, list[v2]]]:
+        """
+        Returns the polygons of the diagram, in the same format as
+        make_polygons
+        """
+
+        polygons = [(m, polygon) for m, cell_polygons in enumerate(
+            self.polygons) for polygon in cell_polygons]
+
+        return sorted(polygons, key=lambda p: self.cells[p[0]].weight)
+
+    def insert(self, cell: Cell) -> set[int]:
+        """
+        Adds a cell at the end of the list of cells
+        """
+
+        self.check(cell)
+
+        if self.cache is None:
+            self.cells.append(cell)
+            self.rebuild()
+            return {0}
+
+        cache = self.cache
+        n = len(self.cells)
+
+        # the fake cells of the bounds come right after the real ones
+        self.shift_cells(lambda k: k + (k >= n))
+
+        self.cells.append(cell)
+        cache.all_cells.insert(n, cell)
+        cache.cells_inter.insert(n, [])
+        cache.inter_angles.append({})
+        cache.neighbors.append([])
+        cache.grid.add(n, cell)
+        cache.radii.append(reach_radius(self.bounds, self.cells, cache.grid,
+                                        n, cache.edges))
+        self.polygons.append([])
+
+        return self.update(n, [self.new_area(n)], set(), set())
+
+    def remove(self, index: int) -> set[int]:
+        """
+        Removes the cell at the given index
+        """
+
+        cache = self.cache
+        cell = self.cells[index]
+        area = self.area(self.polygons[index])
+        # the cells that had the removed one as a neighbor lose an edge
+        old = set(cache.neighbors[index]) | {
+            k for k, row in enumerate(cache.neighbors) if index in row}
+
+        changed = self.drop(set(cache.cells_inter[index]))
+
+        self.cells.pop(index)
+        if not self.cells:
+            self.rebuild()
+            return set()
+
+        def shift(k: int) -> int:
+            return k - (k > index)
+
+        cache.all_cells.pop(index)
+        cache.cells_inter.pop(index)
+        cache.inter_angles.pop(index)
+        cache.radii.pop(index)
+        cache.neighbors.pop(index)
+        self.polygons.pop(index)
+
+        cache.neighbors = [[shift(k) for k in row if k != index]
+                           for row in cache.neighbors]
+        self.shift_cells(shift)
+
+        cache.grid.pop(index, cell)
+        # edges are keyed by indices, they are computed again when needed
+        cache.edges.edges.clear()
+        cache.edges.circles.clear()
+
+        return self.update(-1, [area], {shift(k) for k in old},
+                           {shift(k) for k in changed if k != index})
+
+    def move(self, index: int, pos: v2) -> set[int]:
+        """
+        Moves the cell at the given index
+        """
+
+        return self.replace(index, Cell(pos, self.cells[index].weight))
+
+    def set_weight(self, index: int, weight: float) -> set[int]:
+        """
+        Changes the weight of the cell at the given index
+        """
+
+        return self.replace(index, Cell(self.cells[index].pos, weight))
+
+    def replace(self, index: int, cell: Cell) -> set[int]:
+        """
+        Replaces the cell at the given index with another one
+        """
+
+        self.check(cell)
+
+        cache = self.cache
+        old = self.cells[index]
+        area = self.area(self.polygons[index])
+
+        self.cells[index] = cell
+        cache.all_cells[index] = cell
+        cache.grid.move(index, old, cell)
+        cache.edges.forget(index)
+        cache.radii[index] = reach_radius(self.bounds, self.cells,
+                                          cache.grid, index, cache.edges)
+
+        return self.update(index, [area, self.new_area(index)],
+                           set(cache.neighbors[index]), set())
+
+    def shift_cells(self, shift):
+        """
+        Updates the indices of the cells of all the intersections after cells
+        have been inserted or removed
+        """
+
+        for inter in self.cache.intersections:
+            inter.cells = {shift(k) for k in inter.cells}
+
+    def area(self, polygons: list[list[v2]]) -> Bounds | None:
+        """
+        Returns a rectangle holding the given polygons of a cell, grown by
+        the length of their longest side since arcs bulge out of their
+        segments, or None when there are no polygons
+        """
+
+        bounds = self.bounds
+        points = [(x, y) for polygon in polygons for x, y in polygon]
+        if not points:
+            return None
+
+        margin = max(sqrt((x1-x0)*(x1-x0) + (y1-y0)*(y1-y0))
+                     for polygon in polygons
+                     for (x0, y0), (x1, y1) in zip(polygon, polygon[1:]))
+
+        x0 = max(min(x for x, _ in points) - margin, bounds.left)
+        y0 = max(min(y for _, y in points) - margin, bounds.top)
+        x1 = min(max(x for x, _ in points) + margin, bounds.right)
+        y1 = min(max(y for _, y in points) + margin, bounds.bottom)
+
+        return Bounds(x0, y0, max(x1-x0, 0), max(y1-y0, 0))
+
+    def new_area(self, s: int) -> Bounds | None:
+        """
+        Returns a rectangle holding the cell at index s, from its polygons
+        among its closest cells only
+        """
+
+        cells = self.cells
+        if len(cells) == 1:
+            return self.bounds
+
+        nearest = self.cache.grid.nearest(cells[s].pos, reach_samples, s)
+        closest = [cells[s]] + [cells[k] for k in nearest]
+
+        return self.area(cell_polygons(Options(), self.bounds, closest, 0))
+
+    def around(self, s: int, areas: list[Bounds | None]
+               ) -> tuple[set[int], set[tuple[int, int]]]:
+        """
+        Returns the indices of the cells, other than the one at index s, that
+        can be the closest one to a point of the given rectangles, and the
+        pairs (i, j), i < j, of them that can both be the closest one to a
+        point of a piece of the rectangles
+        """
+
+        found, pairs = set(), set()
+        if len(self.cells) == (s != -1):
+            return found, pairs
+
+        for area in areas:
+            if area is None:
+                continue
+
+            for piece in piece_cells(area, self.cells, self.cache.grid, s):
+                found.update(piece)
+                pairs.update((i, j) for i in piece for j in piece if i < j)
+
+        return found, pairs
+
+    def set_neighbor(self, i: int, j: int, value: bool) -> bool:
+        """
+        Updates whether the cell at index j is a neighbor of the cell at index
+        i, returns True if that changed
+        """
+
+        cache = self.cache
+        row = cache.neighbors[i]
+
+        if value == (j in row):
+            return False
+
+        if value:
+            insort(row, j)
+        else:
+            row.remove(j)
+
+        return True
+
+    def drop(self, inters: set[int]) -> set[int]:
+        """
+        Removes intersections from the cache, returns the indices of the
+        cells they belonged to
+        """
+
+        cache = self.cache
+        n = len(self.cells)
+        changed = set()
+
+        # remove the intersections by moving the last one in their place,
+        # starting from the end so that the last one is never being removed
+        for i in sorted(inters, reverse=True):
+            for k in cache.intersections[i].cells:
+                changed.add(k)
+
+                cache.cells_inter[k].remove(i)
+                if k < n:
+                    cache.inter_angles[k].pop(i)
+
+            last = len(cache.intersections)-1
+            moved = cache.intersections.pop()
+
+            if i == last:
+                continue
+
+            cache.intersections[i] = moved
+            for k in moved.cells:
+                row = cache.cells_inter[k]
+                row[row.index(last)] = i
+                if k < n:
+                    cache.inter_angles[k][i] = cache.inter_angles[k].pop(last)
+
+        return changed
+
+    def add(self, inters: list[Intersection]) -> set[int]:
+        """
+        Adds intersections to the cache, returns the indices of the cells
+        they belong to
+        """
+
+        cache = self.cache
+        n = len(self.cells)
+        changed = set()
+
+        for inter in inters:
+            i = len(cache.intersections)
+            cache.intersections.append(inter)
+
+            for k in inter.cells:
+                changed.add(k)
+
+                cache.cells_inter[k].append(i)
+                if k < n:
+                    u = inter.pos - self.cells[k].pos
+                    cache.inter_angles[k][i] = atan2(u.y, u.x)
+
+        return changed
+
+    def update(self, s: int, areas: list[Bounds | None], old: set[int],
+               changed: set[int]) -> set[int]:
+        """
+        Updates the cache around an edited cell.
+        s: index of the new or modified cell, -1 if a cell was removed
+        areas: rectangles holding the edited cell before and after the edit,
+            None when it has no polygons
+        old: indices of the neighbors of the cell before the edit
+        changed: indices of the cells already known to have changed
+        """
+
+        cells, bounds, cache = self.cells, self.bounds, self.cache
+        grid, edges, radii = cache.grid, cache.edges, cache.radii
+        n = len(cells)
+
+        # Outside of the areas, the edited cell is not the closest one, before
+        # and after the edit. Neighbors and intersections can only change
+        # inside of them, between cells that are both the closest ones to a
+        # point when ignoring the edited cell, so that are found together in
+        # a piece of the areas.
+        group, pairs = self.around(s, areas)
+        group |= old
+
+        # these cells took or gave some space to the edited one
+        for k in group:
+            radii[k] = reach_radius(bounds, cells, grid, k, edges)
+
+        if s != -1:
+            pairs.update((min(s, k), max(s, k)) for k in group)
+            group.add(s)
+            changed.add(s)
+
+        ordered = sorted(pairs)
+        memo = {}
+
+        for i, j in ordered:
+            if not in_reach(cells, radii, i, j):
+                for a, b in ((i, j), (j, i)):
+                    if self.set_neighbor(a, b, False):
+                        changed |= {a, b}
+                continue
+
+            # only the cells around the pair can cut its edge
+            others = cutting_cells(bounds, cells, grid, radii, i, j, memo)
+            for a, b in ((i, j), (j, i)):
+                if self.set_neighbor(a, b, is_neighbor(bounds, cells, a, b,
+                                                       edges, others)):
+                    changed |= {a, b}
+
+        # forget about the intersections between these pairs only, the other
+        # ones are between cells that were never both the closest ones in the
+        # areas
+        inters = set()
+
+        # the corners are cheap to find again, replace all of them
+        for c in range(n, n+4):
+            for i in cache.cells_inter[c]:
+                if sum(k >= n for k in cache.intersections[i].cells) == 2:
+                    inters.add(i)
+
+        for k in group:
+            for i in cache.cells_inter[k]:
+                real = sorted(c for c in cache.intersections[i].cells if c < n)
+                if k == s or all((a, b) in pairs
+                                 for a in real for b in real if a < b):
+                    inters.add(i)
+
+        dropped = [cache.intersections[i] for i in inters]
+        self.drop(inters)
+
+        # intersections between three cells, in the same order as
+        # intersections.cells_intersections
+        new_inters = []
+        neighbors = cache.neighbors
+
+        for i in sorted(group):
+            for j in neighbors[i]:
+                if j < i or (i, j) not in pairs:
+                    continue
+
+                for k in neighbors[j]:
+                    if k <= i or k < j or (j, k) not in pairs:
+                        continue
+                    if k not in neighbors[i] or (i, k) not in pairs:
+                        continue
+
+                    new_inters += triple_intersections(bounds, cells, grid,
+                                                       edges, i, j, k)
+
+        # intersections with the bounds
+        bound_inters = []
+        for i, j in ordered:
+            for a, b in ((i, j), (j, i)):
+                if in_reach(cells, radii, a, b):
+                    bound_inters += pair_bounds_intersections(
+                        bounds, cells, grid, edges, a, b)
+
+        new_inters += unique_intersections(bounds, bound_inters, n)
+        new_inters += corner_intersections(bounds, cells, grid)
+
+        self.add(new_inters)
+
+        # the edges with the edited cell changed, even for cells without
+        # intersections, made of a single circle
+        if s != -1:
+            changed |= set(neighbors[s])
+            changed |= {k for k in group if s in neighbors[k]}
+        changed |= old
+
+        # the cells of the intersections that are really new or gone
+        def key(inter: Intersection):
+            return frozenset(inter.cells), inter.pos.x, inter.pos.y
+
+        before = {key(inter) for inter in dropped}
+        after = {key(inter) for inter in new_inters}
+        for cells_key, _, _ in before ^ after:
+            changed |= cells_key
+
+        # rebuild the polygons that changed, the cached edges being keyed by
+        # indices of intersections that moved
+        changed = {m for m in changed if m < n}
+        cache.edge_cache.clear()
+
+        for m in changed:
+            self.polygons[m] = build_cell(bounds, cache, m)
+
+        cache.edge_cache.clear()
+
+        return changed
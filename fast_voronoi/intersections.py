@@ -1,77 +1,96 @@
-from .utils import smol, perp_bisector, get_equidistant, get_circle, \
-        closest_cell, circle_inter, circle_inter_line
+from .utils import smol, line_inter_xy, circle_inter_xy, circle_inter_line_xy
 
 from .classes.v2 import v2
 from .classes.cell import Cell, FakeCell
 from .classes.bounds import Bounds
 from .classes.intersection import Intersection
+from .classes.cell_grid import CellGrid
+from .classes.edge_store import EdgeStore
+
+
+def triple_intersections(bounds: Bounds, cells: list[Cell], grid: CellGrid,
+                         edges: EdgeStore, i: int, j: int, k: int
+                         ) -> list[Intersection]:
+    """
+    Computes the intersection points between the cells at indices i, j and k,
+    which should be sorted and all be neighbors of each other
+    """
+
+    A, B, P = cells[i], cells[j], cells[k]
+    ab_is_line = abs(A.weight - B.weight) < smol
+
+    if ab_is_line:
+        if abs(A.weight - P.weight) < smol:
+            inter = line_inter_xy(*edges.line(i, j), *edges.line(i, k))
+            inters = [] if not inter else [inter]
+
+        else:
+            inters = circle_inter_line_xy(*edges.line(i, j),
+                                          *edges.circle(i, k))
+
+    else:
+        if abs(A.weight - P.weight) < smol:
+            inters = circle_inter_line_xy(*edges.line(i, k),
+                                          *edges.circle(i, j))
+        else:
+            inters = circle_inter_xy(*edges.circle(i, j),
+                                     *edges.circle(i, k))
+
+    intersections = []
+
+    for x, y in inters:
+        # check if the intersection is in bounds
+        if not (bounds.left <= x <= bounds.right and
+                bounds.top <= y <= bounds.bottom):
+            continue
+
+        inter = v2(x, y)
+
+        # check if the intersection is not blocked
+        if grid.closest(inter) not in (i, j, k):
+            continue
+
+        intersections.append(Intersection(inter, {i, j, k}))
+
+    return intersections
 
 
 def cells_intersections(bounds: Bounds, cells: list[Cell],
-                        neighbors: list[list[int]]):
+                        neighbors: list[list[int]], grid: CellGrid,
+                        edges: EdgeStore):
     intersections = []
 
-    for i, A in enumerate(cells):
+    # faster membership tests
+    neighbor_sets = [set(row) for row in neighbors]
+
+    for i in range(len(cells)):
         for j in neighbors[i]:
             if j < i:
                 continue
 
-            B = cells[j]
-            ab_is_line = abs(A.weight - B.weight) < smol
-
             for k in neighbors[j]:
                 if k <= i or k < j:
                     continue
-                if k not in neighbors[i]:
+                if k not in neighbor_sets[i]:
                     continue
 
-                P = cells[k]
-
-                if ab_is_line:
-                    if abs(A.weight - P.weight) < smol:
-                        inter = get_equidistant(A.pos, B.pos, P.pos)
-                        inters = [] if not inter else [inter]
-
-                    else:
-                        line = perp_bisector(A.pos, B.pos)
-                        circle = get_circle(A, P)
-                        inters = circle_inter_line(line, circle)
-
-                else:
-                    if abs(A.weight - P.weight) < smol:
-                        line = perp_bisector(A.pos, P.pos)
-                        circle = get_circle(A, B)
-                        inters = circle_inter_line(line, circle)
-                    else:
-                        circle1 = get_circle(A, B)
-                        circle2 = get_circle(A, P)
-                        inters = circle_inter(circle1, circle2)
-
-                if inters is not None:
-                    for inter in inters:
-                        # check if the intersection is in bounds
-                        if not bounds.is_inside(inter):
-                            continue
-
-                        # check if the intersection is not blocked
-                        if closest_cell(cells, inter) not in (i, j, k):
-                            continue
-
-                        intersections.append(Intersection(inter, {A, B, P}))
+                intersections += triple_intersections(bounds, cells, grid,
+                                                      edges, i, j, k)
 
     return intersections
 
 
-def add_inter(bounds: Bounds, cells: list[Cell],
+def add_inter(bounds: Bounds, grid: CellGrid,
               intersections: list[Intersection], inter: v2, component: int,
-              i: int, j: int, C: Cell):
+              i: int, j: int, c: int):
     """
     Helper function, used to make several checks to an intersection point
     before adding it to a list
+    c: index of the fake cell of the side of the bounds
     """
 
     # check if the intersection point is part of the cell
-    if closest_cell(cells, inter) not in (i, j):
+    if grid.closest(inter) not in (i, j):
         return
 
     # check if the intersection is inside the bounds
@@ -82,81 +101,180 @@ def add_inter(bounds: Bounds, cells: list[Cell],
         if not bounds.top <= inter.y <= bounds.bottom:
             return
 
-    intersections.append(Intersection(inter, {cells[i], cells[j], C}))
+    intersections.append(Intersection(inter, {i, j, c}))
 
 
-def bounds_intersections(bounds: Bounds, cells: list[Cell]
-                         ) -> tuple[list[Intersection], list[FakeCell]]:
-
-    intersections = []
+def make_fake_cells(bounds: Bounds) -> list[FakeCell]:
+    """
+    Creates the fake cells used for the intersections with the bounds
+    """
 
-    # create fake cells for the intersection with the bounds
     names = ["top", "right", "bottom", "left"]
-    fake_cells = [FakeCell(pos, names[i])
-                  for i, pos in zip(range(4), bounds.fake_pos)]
+
+    return [FakeCell(pos, names[i])
+            for i, pos in zip(range(4), bounds.fake_pos)]
+
+
+def pair_bounds_intersections(bounds: Bounds, cells: list[Cell],
+                              grid: CellGrid, edges: EdgeStore, i: int, j: int
+                              ) -> list[Intersection]:
+    """
+    Computes the intersection points between the edge of the cells at indices
+    i and j and the bounds
+    """
+
+    intersections: list[Intersection] = []
+
+    A, B = cells[i], cells[j]
+    n = len(cells)
 
     # cache some shorthand variables that help the code be smaller
     sides = (bounds.top, bounds.right, bounds.bottom, bounds.left)
     components = (1, 0, 1, 0)
 
-    for i, A in enumerate(cells):
-        for j, B in enumerate(cells):
-            if i == j:
+    if abs(A.weight - B.weight) < smol:
+        # find the intersection point of the two cells and the bounds
+        mx, my, ux, uy = edges.line(i, j)
+        M, u = (mx, my), (ux, uy)
+
+        for c, target, component in zip(range(4), sides, components):
+            div = u[component]
+            if not div:
                 continue
 
-            if abs(A.weight - B.weight) < smol:
-                # find the intersection point of the two cells and the bounds
-                line = perp_bisector(A.pos, B.pos)
+            t = (target - M[component]) / div
 
-                for c, target, component in zip(range(4), sides, components):
-                    div = line.u[component]
-                    if not div:
-                        continue
+            inter = v2(mx + ux*t, my + uy*t)
 
-                    t = (target - line.M[component]) / div
+            add_inter(bounds, grid, intersections, inter, component, i, j,
+                      n+c)
 
-                    inter = line.M + line.u*t
+    else:
+        circle = edges.circle(i, j)
 
-                    add_inter(bounds, cells, intersections, inter,
-                              component, i, j, fake_cells[c])
+        for c, (line, _), component in zip(
+                range(4), bounds.lines, components):
 
-            else:
-                circle = get_circle(A, B)
+            for x, y in circle_inter_line_xy(line.M.x, line.M.y,
+                                             line.u.x, line.u.y, *circle):
+                inter = v2(x, y)
 
-                for c, (line, _), component in zip(
-                        range(4), bounds.lines, components):
+                # check if the intersection point is part of the cell
+                if grid.closest(inter) not in (i, j):
+                    continue
 
-                    for inter in circle_inter_line(line, circle):
-                        # check if the intersection point is part of the cell
-                        if closest_cell(cells, inter) not in (i, j):
-                            continue
+                add_inter(bounds, grid, intersections, inter, component,
+                          i, j, n+c)
 
-                        add_inter(bounds, cells, intersections, inter,
-                                  component, i, j, fake_cells[c])
+    return intersections
+
+
+def corner_intersections(bounds: Bounds, cells: list[Cell], grid: CellGrid
+                         ) -> list[Intersection]:
+    """
+    Creates the intersections for the bounds corners, between the two fake
+    cells of the neighboring sides and the closest cell
+    """
+
+    intersections = []
+    n = len(cells)
 
-    # add the corner intersections
     for i, corner in enumerate(bounds.corners):
         # find the indices of the neighboring sides
-        c0 = fake_cells[i//2 * 2]
-        c1 = fake_cells[1 + 2 * (i == 0 or i == 3)]
+        c0 = n + i//2 * 2
+        c1 = n + 1 + 2 * (i == 0 or i == 3)
 
         intersections.append(Intersection(
-            corner, {cells[closest_cell(cells, corner)], c0, c1}))
+            corner, {grid.closest(corner), c0, c1}))
 
-    # remove duplicate intersections
+    return intersections
+
+
+def unique_intersections(bounds: Bounds, intersections: list[Intersection],
+                         n: int) -> list[Intersection]:
+    """
+    Removes duplicate intersections, keeping the first ones. Intersections
+    between the same real cells (the n first ones) at points closer than a
+    tiny fraction of the size of the bounds are considered equal, and are
+    found by hashing these cells and the rounded coordinates.
+    The fake cells are left out so that an edge going through a corner of
+    the bounds is only kept once, while the corner itself, between other
+    cells, is always kept.
+    """
+
+    tol = smol * max(bounds.w, bounds.h, 1)
+
+    # positions of the kept intersections, by real cells and rounded
+    # coordinates
+    kept: dict[tuple[frozenset[int], int, int], list[v2]] = {}
     final = []
+
     for inter in intersections:
-        if inter not in final:
-            final.append(inter)
+        x, y = inter.pos.x, inter.pos.y
+        cells = frozenset(k for k in inter.cells if k < n)
+        kx, ky = round(x / tol), round(y / tol)
+
+        # equal points can be rounded to neighboring keys
+        if any(abs(P.x-x) <= tol and abs(P.y-y) <= tol
+               for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+               for P in kept.get((cells, kx+dx, ky+dy), ())):
+            continue
+
+        kept.setdefault((cells, kx, ky), []).append(inter.pos)
+        final.append(inter)
 
-    return final, fake_cells
+    return final
+
+
+def bounds_intersections(bounds: Bounds, cells: list[Cell], grid: CellGrid,
+                         edges: EdgeStore,
+                         candidates: list[list[int]] | None = None
+                         ) -> tuple[list[Intersection], list[FakeCell]]:
+    """
+    Computes the intersection points between the edges of the cells and the
+    bounds, as well as the bounds corners.
+    candidates optionally restricts the pairs of cells to look at (see
+    neighbors.neighbor_candidates), all of them are used otherwise.
+    """
+
+    intersections = []
+
+    # create fake cells for the intersection with the bounds
+    fake_cells = make_fake_cells(bounds)
+
+    for i in range(len(cells)):
+        for j in candidates[i] if candidates else range(len(cells)):
+            if i == j:
+                continue
+
+            intersections += pair_bounds_intersections(bounds, cells, grid,
+                                                       edges, i, j)
+
+    # add the corner intersections
+    intersections += corner_intersections(bounds, cells, grid)
+
+    return unique_intersections(bounds, intersections, len(cells)), \
+        fake_cells
 
 
 def all_intersections(bounds: Bounds, cells: list[Cell],
-                      neighbors: list[list[int]]
+                      neighbors: list[list[int]], grid: CellGrid | None = None,
+                      candidates: list[list[int]] | None = None,
+                      edges: EdgeStore | None = None
                       ) -> tuple[list[Intersection], list[FakeCell]]:
+    """
+    Computes the intersection points between cells, and between cells and
+    bounds. grid and edges are built from cells when not given, and
+    candidates is passed to bounds_intersections.
+    """
+
+    if grid is None:
+        grid = CellGrid(cells)
+    if edges is None:
+        edges = EdgeStore(cells)
 
-    inter1 = cells_intersections(bounds, cells, neighbors)
-    inter2, fake_cells = bounds_intersections(bounds, cells)
+    inter1 = cells_intersections(bounds, cells, neighbors, grid, edges)
+    inter2, fake_cells = bounds_intersections(bounds, cells, grid, edges,
+                                              candidates)
 
     return inter1+inter2, fake_cells
@@ -0,0 +1,188 @@
+import numpy as np
+from math import sqrt
+
+from .classes.v2 import v2
+from .classes.cell import Cell
+from .classes.cell_grid import CellGrid
+from .classes.cell_array import CellArray
+
+# number of point-cell distances computed at once by default
+default_chunk = 1 << 20
+# below this many cells, all of them are looked at for every point
+brute_cells = 32
+
+
+def as_cell_array(cells: list[Cell] | CellArray) -> CellArray:
+    if isinstance(cells, CellArray):
+        return cells
+
+    return CellArray.from_cells(cells)
+
+
+def closest_in(positions: np.ndarray, weights: np.ndarray,
+               points: np.ndarray, chunk: int) -> np.ndarray:
+    """
+    Same as utils.closest_cell for every point, looking at all the given
+    cells, with at most chunk distances computed at once
+    """
+
+    result = np.empty(len(points), dtype=np.intp)
+    rows = max(chunk // max(len(positions), 1), 1)
+
+    for k in range(0, len(points), rows):
+        d = (positions[None] - points[k:k+rows, None]) * weights[None, :, None]
+        # argmin keeps the first of equal distances, like closest_cell
+        result[k:k+rows] = np.argmin(d[..., 0]*d[..., 0] + d[..., 1]*d[..., 1],
+                                     axis=1)
+
+    return result
+
+
+def rect_candidates(positions: np.ndarray, weights: np.ndarray,
+                    rects: np.ndarray) -> np.ndarray:
+    """
+    Tells which cells can be the closest one to a point of each rectangle,
+    given as rows of (x0, y0, x1, y1). Returns a boolean array of shape
+    (number of rectangles, number of cells).
+    A cell is left out when its smallest weighted distance to the rectangle
+    is larger than the largest one of another cell, which is then closer to
+    every point of the rectangle.
+    """
+
+    x, y = positions[:, 0], positions[:, 1]
+    x0, y0, x1, y1 = (rects[:, k, None] for k in range(4))
+    w2 = weights*weights
+
+    near_x = np.maximum(np.maximum(x0-x, x-x1), 0)
+    near_y = np.maximum(np.maximum(y0-y, y-y1), 0)
+    far_x = np.maximum(x-x0, x1-x)
+    far_y = np.maximum(y-y0, y1-y)
+
+    near = (near_x*near_x + near_y*near_y) * w2
+    far = np.min((far_x*far_x + far_y*far_y) * w2, axis=1)
+
+    # leave some room for rounding errors
+    return near <= far[:, None] * (1+1e-9)
+
+
+def locate(cells: list[Cell] | CellArray, points,
+           neighbors: list[list[int]] | None = None,
+           chunk: int = default_chunk) -> np.ndarray:
+    """
+    Returns the index of the closest cell to every point, taking their weight
+    into account, with the same result as utils.closest_cell.
+    points is an array of shape (N, 2), and the indices are returned as an
+    integer array of shape (N,). Requires NumPy.
+
+    The points are split into tiles, and only the cells that can be the
+    closest to some point of a tile (see rect_candidates) are compared for
+    its points, at most chunk distances at a time.
+
+    neighbors, like Cache.neighbors (for example the ones of a Diagram),
+    makes every point walk from a nearby cell to its closest neighbor
+    instead, until no neighbor is closer (see walk). This is exact when all
+    the cells have the same weight, but with different weights a cell closer
+    than all of its neighbors is not guaranteed to be the closest one, so the
+    default search should be used when exact results are needed.
+    """
+
+    cells = as_cell_array(cells)
+    positions, weights = cells.positions, cells.weights
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+    if not len(positions):
+        raise ValueError('Cannot locate points without cells')
+
+    if neighbors is not None:
+        return walk(cells, points, neighbors)
+
+    if len(positions) <= brute_cells or len(points) <= brute_cells:
+        return closest_in(positions, weights, points, chunk)
+
+    # tiles over the points, about as many as there are cells, so that only a
+    # few of them can be the closest to each tile
+    low, high = points.min(axis=0), points.max(axis=0)
+    w, h = high-low
+    count = min(len(positions), max(len(points) // brute_cells, 1))
+    size = max(sqrt(w*h / count), max(w, h) / count) or 1
+    tx, ty = int(w // size) + 1, int(h // size) + 1
+
+    tiles = ((points-low) // size).astype(np.intp)
+    tile_index = np.minimum(tiles[:, 1], ty-1)*tx + np.minimum(tiles[:, 0],
+                                                               tx-1)
+
+    order = np.argsort(tile_index, kind='stable')
+    used, starts = np.unique(tile_index[order], return_index=True)
+    ends = np.append(starts[1:], len(points))
+
+    rects = np.stack((low[0] + used % tx * size, low[1] + used // tx * size),
+                     axis=1)
+    rects = np.concatenate((rects, rects+size), axis=1)
+
+    result = np.empty(len(points), dtype=np.intp)
+    rows = max(chunk // len(positions), 1)
+
+    for k in range(0, len(used), rows):
+        candidates = rect_candidates(positions, weights, rects[k:k+rows])
+
+        for t, keep in enumerate(candidates, k):
+            indices = np.flatnonzero(keep)
+            inside = order[starts[t]:ends[t]]
+
+            result[inside] = indices[closest_in(
+                positions[indices], weights[indices], points[inside], chunk)]
+
+    return result
+
+
+def walk(cells: CellArray, points: np.ndarray, neighbors: list[list[int]]
+         ) -> np.ndarray:
+    """
+    Moves every point from a cell to its closest neighbor, or the one with
+    the smallest index among equally close ones, until none is closer.
+    Points start from the closest cell to the center of their bucket in a
+    CellGrid, so that walks stay short.
+    """
+
+    positions, weights = cells.positions, cells.weights
+    n = len(positions)
+
+    # neighbor relations can be one-sided, walk both ways
+    linked = [set(row) for row in neighbors]
+    for i, row in enumerate(neighbors):
+        for j in row:
+            linked[j].add(i)
+
+    # every cell and its neighbors sorted by index, so that the first of
+    # equally close cells has the smallest index, padded with the cell itself
+    width = max((len(row) for row in linked), default=0) + 1
+    table = np.repeat(np.arange(n)[:, None], width, axis=1)
+    for i, row in enumerate(linked):
+        table[i, :len(row)+1] = sorted(row | {i})
+
+    grid = CellGrid(cells.to_cells())
+    buckets = np.floor((points - (grid.x0, grid.y0)) / grid.size)
+    buckets[:, 0] = np.clip(buckets[:, 0], grid.bx0, grid.bx1)
+    buckets[:, 1] = np.clip(buckets[:, 1], grid.by0, grid.by1)
+    keys, inverse = np.unique(buckets.astype(np.intp), axis=0,
+                              return_inverse=True)
+
+    starts = [grid.closest(v2(grid.x0 + (bx+.5)*grid.size,
+                              grid.y0 + (by+.5)*grid.size))
+              for bx, by in keys.tolist()]
+    current = np.asarray(starts, dtype=np.intp)[inverse.reshape(-1)]
+
+    active = np.arange(len(points))
+    while len(active):
+        around = table[current[active]]
+        d = (positions[around] - points[active, None]) * \
+            weights[around][..., None]
+        dist = d[..., 0]*d[..., 0] + d[..., 1]*d[..., 1]
+
+        step = around[np.arange(len(active)), np.argmin(dist, axis=1)]
+
+        moved = step != current[active]
+        current[active] = step
+        active = active[moved]
+
+    return current
@@ -1,26 +1,43 @@
+from typing import cast, Sequence
+
 from math import cos, sin, atan2, tau, sqrt
 
-from .utils import smol, dot, get_t, get_closest_to_line, perp_bisector, \
-        get_equidistant, get_dist2, get_circle, circle_inter, circle_inter_line
+from .utils import smol, get_dist2, clip_polygon, \
+        farthest_in_discs, closest_to_line_xy, get_t_xy, line_inter_xy, \
+        circle_inter_xy, circle_inter_line_xy
 
 from .classes.v2 import v2
 from .classes.cell import Cell
 from .classes.line import Line
 from .classes.bounds import Bounds
 from .classes.circle import Circle
+from .classes.cell_grid import CellGrid
+from .classes.edge_store import EdgeStore
+from .classes.stats import Stats
 from .classes.block_manager import StraightBlockManager, CircleBlockManager
 
+# how many nearby cells are used to bound the size of a cell
+reach_samples = 16
+
 
-def cut_line_line(A: Cell, B: Cell, P: Cell, line1: Line,
+def cut_line_line(A: Cell, B: Cell, P: Cell,
+                  line1: tuple[float, float, float, float],
+                  line2: tuple[float, float, float, float],
                   manager: StraightBlockManager) -> bool:
     """
     Computes how a line edge between two cells A and B is affected by
-    another line edge.
+    another line edge, between A and P.
+    Edges are given as in EdgeStore.
     Affects the given manager, but also returns True if the whole line
     gets blocked, False otherwise.
     """
 
-    X = get_equidistant(A.pos, B.pos, P.pos)
+    xa, ya = A.pos.x, A.pos.y
+    xb, yb = B.pos.x, B.pos.y
+    xp, yp = P.pos.x, P.pos.y
+
+    # point equidistant to A, B and P
+    X = line_inter_xy(*line1, *line2)
 
     if X is None:
         # edge case where A, B and P are aligned
@@ -29,19 +46,20 @@ def cut_line_line(A: Cell, B: Cell, P: Cell, line1: Line,
         # blocks the entire thing
         # depending on the ordering of the points
 
-        if dot(v2(P.pos.x-A.pos.x, P.pos.y-A.pos.y),
-               v2(P.pos.x-B.pos.x, P.pos.y-B.pos.y)) < 0:
+        if (xp-xa)*(xp-xb) + (yp-ya)*(yp-yb) < 0:
             # P is between A and B
             return True
         return False
 
+    mx, my, ux, uy = line1
+
     # get how far down the line this point is
-    t = get_t(line1, X)
+    t = get_t_xy(mx, my, ux, uy, *X)
 
     # get which bound is being modified by looking at
     # which side of (AB) P is
-    H = get_closest_to_line(line1, P.pos)
-    t_side = get_t(line1, H)
+    H = closest_to_line_xy(mx, my, ux, uy, xp, yp)
+    t_side = get_t_xy(mx, my, ux, uy, *H)
 
     if t_side < 0:
         manager.block_min(t)
@@ -51,24 +69,28 @@ def cut_line_line(A: Cell, B: Cell, P: Cell, line1: Line,
     return manager.is_blocked
 
 
-def cut_line_circle(A: Cell, P: Cell, line1: Line,
+def cut_line_circle(A: Cell, P: Cell,
+                    line1: tuple[float, float, float, float],
+                    circle2: tuple[float, float, float],
                     manager: StraightBlockManager) -> bool:
     """
     Computes how a line edge between two cells A and B is affected by
-    another circle edge.
+    another circle edge, between A and P.
+    Edges are given as in EdgeStore.
     Affects the given manager, but also returns True if the whole line
     gets blocked, False otherwise.
     """
 
-    circle2 = get_circle(A, P)
-    intersections = circle_inter_line(line1, circle2)
+    mx, my, ux, uy = line1
+
+    intersections = circle_inter_line_xy(mx, my, ux, uy, *circle2)
 
     if not intersections:
         # only block if the circle is around A
         return A.weight > P.weight
 
-    t0 = get_t(line1, intersections[0])
-    t1 = get_t(line1, intersections[1])
+    t0 = get_t_xy(mx, my, ux, uy, *intersections[0])
+    t1 = get_t_xy(mx, my, ux, uy, *intersections[1])
 
     if t0 > t1:
         t0, t1 = t1, t0
@@ -85,26 +107,25 @@ def cut_line_circle(A: Cell, P: Cell, line1: Line,
     return manager.is_blocked
 
 
-def cut_circle_line_inner(circle: Circle, line: Line, towards_other: v2,
-                          manager: CircleBlockManager) -> bool:
+def cut_circle_line_xy(xc: float, yc: float, r2: float,
+                       mx: float, my: float, ux: float, uy: float,
+                       tx: float, ty: float,
+                       manager: CircleBlockManager) -> bool:
     """
-    Inner part of the circle/line blocking algorithm, used to compute
-    intersection where the line is already known, for example with bounds.
-    towards_other: vector indicating which side of the line goes towards
-    the side that should be blocked.
+    Same as cut_circle_line_inner, for a circle (xc, yc, r2), a line
+    (mx, my), (ux, uy) and a vector (tx, ty) given as floats
     """
 
-    intersections = circle_inter_line(line, circle)
+    intersections = circle_inter_line_xy(mx, my, ux, uy, xc, yc, r2)
 
     if len(intersections) < 2:
         return False
 
     # block a part of the circle
 
-    da = intersections[0]-circle.c
-    db = intersections[1]-circle.c
-    a_a = atan2(da.y, da.x)
-    a_b = atan2(db.y, db.x)
+    (xa, ya), (xb, yb) = intersections
+    a_a = atan2(ya-yc, xa-xc)
+    a_b = atan2(yb-yc, xb-xc)
 
     if a_b < a_a:
         a_b += tau
@@ -112,11 +133,10 @@ def cut_circle_line_inner(circle: Circle, line: Line, towards_other: v2,
     # find which side of the circle is blocked by checking which arc is
     # farthest into P (dot product with vector from A to B is positive)
 
-    # create a test point in the arc between a_a and a_b
+    # direction of a test point in the arc between a_a and a_b
     a_mid = (a_a+a_b) / 2
-    test_point = line.M + v2(cos(a_mid), sin(a_mid))
 
-    if dot(test_point-line.M, towards_other) > 0:
+    if cos(a_mid)*tx + sin(a_mid)*ty > 0:
         manager.add_block((a_a, a_b))
     else:
         manager.add_block((a_b, a_a+tau))
@@ -124,18 +144,33 @@ def cut_circle_line_inner(circle: Circle, line: Line, towards_other: v2,
     return manager.is_blocked
 
 
-def cut_circle_line(A: Cell, P: Cell, circle1: Circle,
+def cut_circle_line_inner(circle: Circle, line: Line, towards_other: v2,
+                          manager: CircleBlockManager) -> bool:
+    """
+    Inner part of the circle/line blocking algorithm, used to compute
+    intersection where the line is already known, for example with bounds.
+    towards_other: vector indicating which side of the line goes towards
+    the side that should be blocked.
+    """
+
+    return cut_circle_line_xy(circle.c.x, circle.c.y, circle.r2,
+                              line.M.x, line.M.y, line.u.x, line.u.y,
+                              towards_other.x, towards_other.y, manager)
+
+
+def cut_circle_line(A: Cell, P: Cell, circle1: tuple[float, float, float],
+                    line2: tuple[float, float, float, float],
                     manager: CircleBlockManager) -> bool:
     """
     Computes how a circle edge between two cells A and B is affected by
-    another line edge.
+    another line edge, between A and P.
+    Edges are given as in EdgeStore.
     Affects the given manager, but also returns True if the whole circle
     gets blocked, False otherwise.
     """
 
-    line2 = perp_bisector(A.pos, P.pos)
-
-    return cut_circle_line_inner(circle1, line2, P.pos-A.pos, manager)
+    return cut_circle_line_xy(*circle1, *line2, P.pos.x-A.pos.x,
+                              P.pos.y-A.pos.y, manager)
 
 
 def cut_circle_bounds(circle: Circle, box: Bounds,
@@ -149,17 +184,20 @@ def cut_circle_bounds(circle: Circle, box: Bounds,
         cut_circle_line_inner(circle, line, u, manager)
 
 
-def cut_circle_circle(A: Cell, P: Cell, circle1: Circle,
+def cut_circle_circle(A: Cell, P: Cell, circle1: tuple[float, float, float],
+                      circle2: tuple[float, float, float],
                       manager: CircleBlockManager) -> bool:
     """
     Computes how a circle edge between two cells A and B is affected by
-    another circle edge.
+    another circle edge, between A and P.
+    Edges are given as in EdgeStore.
     Affects the given manager, but also returns True if the whole circle
     gets blocked, False otherwise.
     """
 
-    circle2 = get_circle(A, P)
-    intersections = circle_inter(circle1, circle2)
+    x1, y1, r1 = circle1
+    x2, y2, r2 = circle2
+    intersections = circle_inter_xy(x1, y1, r1, x2, y2, r2)
 
     """
     if len(intersections) < 2:
@@ -175,27 +213,28 @@ def cut_circle_circle(A: Cell, P: Cell, circle1: Circle,
         continue
     """
     if len(intersections) < 2:
-        return circle2.r2 < circle1.r2 and A.weight > P.weight
+        return r2 < r1 and A.weight > P.weight
 
     # compute which side of the circle will be blocked, depending on
     # where P is: find the center of the arc created by the block,
     # and see whether it is closer than the original edge
 
-    da = intersections[0]-circle1.c
-    db = intersections[1]-circle1.c
-    a_a = atan2(da.y, da.x)
-    a_b = atan2(db.y, db.x)
+    (xa, ya), (xb, yb) = intersections
+    a_a = atan2(ya-y1, xa-x1)
+    a_b = atan2(yb-y1, xb-x1)
 
     if a_b < a_a:
         a_b += tau
 
     a_mid = (a_a+a_b) / 2
-    mid = circle1.c + v2(cos(a_mid), sin(a_mid)) * sqrt(circle1.r2)
+    radius = sqrt(r1)
+    dx = x2 - (x1 + cos(a_mid)*radius)
+    dy = y2 - (y1 + sin(a_mid)*radius)
 
     # flip condition if the other circle is centered around A, as
     # that means the incut part of the edge is the one that is the
     # most outside of the second circle instead of inside
-    cond = get_dist2(circle2.c, mid) < circle2.r2
+    cond = dx*dx + dy*dy < r2
     cond ^= A.weight >= P.weight
 
     manager.add_block((a_a, a_b) if cond else (a_b, a_a+tau))
@@ -203,33 +242,62 @@ def cut_circle_circle(A: Cell, P: Cell, circle1: Circle,
     return manager.is_blocked
 
 
-def is_neighbor(bounds: Bounds, cells: list[Cell], i: int, j: int) -> bool:
+def early_exit(stats: Stats | None) -> bool:
     """
-    Checks if the cells inside cells at indices i and j are neighbors
+    Counts is_neighbor stopping before looking at all the cells, when stats
+    are being measured, and returns its result
+    """
+
+    if stats is not None:
+        stats.count('is_neighbor_early_exits')
+
+    return False
+
+
+def is_neighbor(bounds: Bounds, cells: list[Cell], i: int, j: int,
+                edges: EdgeStore | None = None,
+                others: Sequence[int] | None = None) -> bool:
+    """
+    Checks if the cells inside cells at indices i and j are neighbors.
+    edges can be given to share the edges between cells across calls.
+    others can be given to only look at the cells at these indices when
+    cutting the edge, when the other ones are known not to cut it (see
+    tiles.cutting_cells).
     """
     if i == j:
         return False
 
+    stats = Stats.active
+    if stats is not None:
+        stats.count('is_neighbor')
+
+    if edges is None:
+        edges = EdgeStore(cells)
+
+    if others is None:
+        others = range(len(cells))
+
     A, B = cells[i], cells[j]
 
     # base edge is a line
     if abs(A.weight - B.weight) < smol:
-        line1 = perp_bisector(A.pos, B.pos)
-        manager = StraightBlockManager(line1, bounds)
+        line1 = edges.line(i, j)
+        manager = StraightBlockManager(edges.get(i, j), bounds)
 
-        for k, P in enumerate(cells):
+        for k in others:
             if i == k or j == k:
                 continue
+            P = cells[k]
 
             # other edge is also a line
             if abs(A.weight - P.weight) < smol:
-                if cut_line_line(A, B, P, line1, manager):
-                    return False
+                if cut_line_line(A, B, P, line1, edges.line(i, k), manager):
+                    return early_exit(stats)
 
             # other edge is a circle
             else:
-                if cut_line_circle(A, P, line1, manager):
-                    return False
+                if cut_line_circle(A, P, line1, edges.circle(i, k), manager):
+                    return early_exit(stats)
 
     # base edge is a circle
     else:
@@ -241,23 +309,129 @@ def is_neighbor(bounds: Bounds, cells: list[Cell], i: int, j: int) -> bool:
         # easier logic
         if A.weight < B.weight:
             A, B = B, A
+            i, j = j, i
 
-        circle1 = get_circle(A, B)
+        circle1 = edges.circle(i, j)
         manager = CircleBlockManager()
-        cut_circle_bounds(circle1, bounds, manager)
+        cut_circle_bounds(cast(Circle, edges.get(i, j)), bounds, manager)
 
-        for k, P in enumerate(cells):
+        for k in others:
             if i == k or j == k:
                 continue
+            P = cells[k]
 
             # other edge is a line
             if abs(A.weight - P.weight) < smol:
-                if cut_circle_line(A, P, circle1, manager):
-                    return False
+                if cut_circle_line(A, P, circle1, edges.line(i, k), manager):
+                    return early_exit(stats)
 
             # other edge is also a circle
             else:
-                if cut_circle_circle(A, P, circle1, manager):
-                    return False
+                if cut_circle_circle(A, P, circle1, edges.circle(i, k),
+                                     manager):
+                    return early_exit(stats)
 
     return True
+
+
+def reach_radius(bounds: Bounds, cells: list[Cell], grid: CellGrid,
+                 i: int, edges: EdgeStore | None = None) -> float:
+    """
+    Returns a radius around the cell at index i, such that all the points of
+    the bounds belonging to that cell are inside the matching circle.
+    Only a few cells are looked at, so this is an upper bound: equally
+    weighted cells clip the bounds rectangle with their perpendicular
+    bisector, lighter cells keep the inside of their edge circle, and
+    heavier cells take the inside of their edge circle away.
+    Those cells are the nearest ones, then the closest one to the farthest
+    point of what is left, until that point belongs to the cell.
+    """
+
+    if edges is None:
+        edges = EdgeStore(cells)
+
+    A = cells[i]
+    polygon = list(bounds.corners)
+    inside: list[tuple[float, float, float]] = []
+    outside: list[tuple[float, float, float]] = []
+
+    samples = grid.nearest(A.pos, reach_samples, i)
+    seen = set(samples)
+    radius = 0.
+
+    for _ in range(reach_samples+1):
+        for k in samples:
+            P = cells[k]
+
+            if abs(A.weight - P.weight) < smol:
+                polygon = clip_polygon(polygon, (A.pos+P.pos) * .5,
+                                       P.pos-A.pos)
+            elif A.weight > P.weight:
+                inside.append(edges.circle(i, k))
+            else:
+                outside.append(edges.circle(i, k))
+
+        radius, x, y = farthest_in_discs(polygon, inside, outside,
+                                         A.pos.x, A.pos.y)
+
+        k = grid.closest(v2(x, y))
+        if k == i or k in seen:
+            break
+
+        samples = [k]
+        seen.add(k)
+
+    return radius
+
+
+def in_reach(cells: list[Cell], radii: list[float], i: int, j: int) -> bool:
+    """
+    Checks if the cells at indices i and j are close enough to be neighbors,
+    given the reach radii of the cells (see reach_radius)
+    """
+
+    reach = (radii[i]+radii[j]) * (1+1e-6)
+
+    return get_dist2(cells[i].pos, cells[j].pos) <= reach*reach
+
+
+def neighbor_candidates(bounds: Bounds, cells: list[Cell], grid: CellGrid,
+                        radii: list[float] | None = None,
+                        edges: EdgeStore | None = None) -> list[list[int]]:
+    """
+    Returns, for every cell, the sorted list of indices of the cells that
+    could be its neighbors.
+    Two cells can only be neighbors if they are closer than the sum of their
+    reach radii (see reach_radius), so all the other pairs are left out
+    without having to run is_neighbor on them.
+    The radii are computed when not given.
+    """
+
+    if radii is None:
+        if edges is None:
+            edges = EdgeStore(cells)
+        radii = [reach_radius(bounds, cells, grid, i, edges)
+                 for i in range(len(cells))]
+
+    candidates: list[set[int]] = [set() for _ in range(len(cells))]
+
+    for i, A in enumerate(cells):
+        # the largest radius of a valid pair is at least half the distance
+        # between the cells, so only look around from that side
+        for j in grid.within(A.pos, 2*radii[i]):
+            if i != j and in_reach(cells, radii, i, j):
+                candidates[i].add(j)
+                candidates[j].add(i)
+
+    return [sorted(row) for row in candidates]
+
+
+def cell_candidates(cells: list[Cell], grid: CellGrid, radii: list[float],
+                    i: int) -> list[int]:
+    """
+    Same as neighbor_candidates, for the cell at index i only
+    """
+
+    found = grid.within(cells[i].pos, radii[i] + max(radii))
+
+    return sorted(j for j in found if i != j and in_reach(cells, radii, i, j))
@@ -0,0 +1,240 @@
+from os import cpu_count
+from copy import copy
+from array import array
+from collections import deque
+from typing import Iterable, Iterator
+from multiprocessing import get_context, get_all_start_methods, \
+        resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ProcessPoolExecutor
+
+from .classes.v2 import v2
+from .classes.cell import Cell
+from .classes.bounds import Bounds
+from .classes.options import Options
+from .classes.edge_store import EdgeStore
+
+from .neighbors import is_neighbor
+from .polygons import Cache, build_cell, make_polygons
+
+# data set once in every worker process
+worker_state = {}
+
+
+def worker_count(options: Options) -> int:
+    """
+    Number of processes asked for in the options
+    """
+
+    return options.workers or cpu_count() or 1
+
+
+def init_neighbors_worker(bounds: tuple[float, float, float, float],
+                          cells: list[tuple[float, float, float]]):
+    """
+    Rebuilds the cells in a worker, from the compact form they are sent in
+    """
+
+    cells_list = [Cell(v2(x, y), w) for x, y, w in cells]
+
+    worker_state['bounds'] = Bounds(*bounds)
+    worker_state['cells'] = cells_list
+    worker_state['edges'] = EdgeStore(cells_list)
+
+
+def neighbors_rows(rows: list[tuple[int, list[int]]]) -> list[list[int]]:
+    """
+    Finds which candidates are neighbors, for a chunk of rows given as
+    (i, candidates of i)
+    """
+
+    bounds = worker_state['bounds']
+    cells = worker_state['cells']
+    edges = worker_state['edges']
+
+    return [[j for j in candidates if is_neighbor(bounds, cells, i, j, edges)]
+            for i, candidates in rows]
+
+
+def parallel_neighbors(options: Options, bounds: Bounds, cells: list[Cell],
+                       candidates: list[list[int]]) -> list[list[int]]:
+    """
+    Same result as calling is_neighbor on all the candidates, using a pool of
+    processes. Rows are split into chunks, a few per process, to even out the
+    work between them.
+    """
+
+    workers = worker_count(options)
+
+    compact_bounds = (bounds.x, bounds.y, bounds.w, bounds.h)
+    compact_cells = [(cell.pos.x, cell.pos.y, cell.weight) for cell in cells]
+
+    rows = list(enumerate(candidates))
+    size = max(len(rows) // (workers*4), 1)
+    chunks = [rows[k:k+size] for k in range(0, len(rows), size)]
+
+    neighbors = []
+    with ProcessPoolExecutor(workers, initializer=init_neighbors_worker,
+                             initargs=(compact_bounds, compact_cells)
+                             ) as pool:
+        for chunk in pool.map(neighbors_rows, chunks):
+            neighbors += chunk
+
+    return neighbors
+
+
+def assemble_shard(shard: list[int]) -> tuple[str, list[tuple[int, int]]]:
+    """
+    Builds the polygons of a list of cells in a forked worker, which
+    inherited the cache, and writes their vertices as (x, y) pairs of doubles
+    in a new shared memory block.
+    Returns the name of the block, and the cell index and number of vertices
+    of every polygon.
+    """
+
+    bounds = worker_state['bounds']
+    cache = worker_state['cache']
+
+    coords = array('d')
+    sizes = []
+
+    for m in shard:
+        for polygon in build_cell(bounds, cache, m):
+            if isinstance(polygon, list):
+                for point in polygon:
+                    coords.append(point.x)
+                    coords.append(point.y)
+            else:
+                coords.frombytes(polygon.tobytes())
+
+            sizes.append((m, len(polygon)))
+
+    data = coords.tobytes()
+    block = SharedMemory(create=True, size=max(len(data), 8))
+    block.buf[:len(data)] = data
+    block.close()
+
+    return block.name, sizes
+
+
+def parallel_polygons(bounds: Bounds, cache: Cache, order: list[int]
+                      ) -> Iterator[tuple[int, list[v2]]]:
+    """
+    Same as building the polygons of the cells one after the other, in the
+    given order, using a pool of forked processes that share the cache with
+    the current one.
+    Workers send the vertices back through shared memory, so that only their
+    sizes have to be pickled, and the polygons are yielded as soon as the
+    shard they belong to is done.
+    Falls back to a single process where fork is not available.
+    """
+
+    n = len(order)
+
+    if 'fork' not in get_all_start_methods():
+        for m in order:
+            for polygon in build_cell(bounds, cache, m):
+                yield m, polygon
+        return
+
+    if cache.options.numpy_output:
+        import numpy as np
+
+    workers = worker_count(cache.options)
+    size = max(n // (workers*4), 1)
+    shards = [order[k:k+size] for k in range(0, n, size)]
+
+    # inherited by the forked workers, as well as the resource tracker, so
+    # that the shared memory blocks they create are tracked by this process
+    worker_state['bounds'] = bounds
+    worker_state['cache'] = cache
+    resource_tracker.ensure_running()
+
+    pool = ProcessPoolExecutor(workers, mp_context=get_context('fork'))
+    futures = [pool.submit(assemble_shard, shard) for shard in shards]
+    read = 0
+
+    try:
+        for future in futures:
+            name, sizes = future.result()
+            block = SharedMemory(name)
+            coords = block.buf.cast('d')
+
+            polygons = []
+            k = 0
+            for m, length in sizes:
+                if cache.options.numpy_output:
+                    polygon = np.array(coords[k:k+2*length]).reshape(-1, 2)
+                else:
+                    polygon = [v2(coords[p], coords[p+1])
+                               for p in range(k, k+2*length, 2)]
+
+                polygons.append((m, polygon))
+                k += 2*length
+
+            coords.release()
+            block.close()
+            block.unlink()
+            read += 1
+
+            yield from polygons
+
+    finally:
+        pool.shutdown(cancel_futures=True)
+        worker_state.clear()
+
+        # the shards finished but never read when the caller stops early
+        for future in futures[read:]:
+            if future.cancelled() or future.exception() is not None:
+                continue
+            block = SharedMemory(future.result()[0])
+            block.close()
+            block.unlink()
+
+
+def make_polygons_batch(options: Options, bounds: Bounds,
+                        frames: Iterable[list[Cell]]
+                        ) -> Iterator[list[tuple[int, list[v2]]]]:
+    """
+    Same as calling make_polygons for every list of cells in frames, for
+    example the frames of an animation, spreading them over a pool of
+    processes (see the workers option).
+    Frames are read as they are needed, at most two per process being worked
+    on at once to keep memory usage flat, and their results are yielded in
+    the same order.
+    """
+
+    workers = worker_count(options)
+
+    # every frame is computed in a single process
+    frame_options = copy(options)
+    frame_options.workers = 1
+
+    if workers == 1:
+        for cells in frames:
+            yield make_polygons(frame_options, bounds, cells)
+        return
+
+    # what happens in other processes is not measured, and the callback
+    # might not be picklable
+    frame_options = copy(frame_options)
+    frame_options.stats = None
+
+    pending = deque()
+
+    with ProcessPoolExecutor(workers) as pool:
+        try:
+            for cells in frames:
+                pending.append(pool.submit(make_polygons, frame_options,
+                                           bounds, cells))
+
+                if len(pending) >= workers*2:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+        finally:
+            # the caller stopped early, do not compute the remaining frames
+            for future in pending:
+                future.cancel()
@@ -1,26 +1,53 @@
-from typing import cast
+from __future__ import annotations
+from typing import cast, Iterator, TYPE_CHECKING
 
-from math import cos, sin, atan2, tau, sqrt, ceil
+from math import cos, sin, acos, atan2, tau, sqrt, ceil
+from time import perf_counter
 
-from .utils import smol, dot, get_dist2, perp_bisector, \
-        get_circle
+from .utils import smol, dot, divide_line
 
 from .classes.v2 import v2
 from .classes.cell import Cell, FakeCell
 from .classes.intersection import Intersection
 from .classes.bounds import Bounds
-from .classes.line import Line
 from .classes.circle import Circle
 from .classes.options import Options
+from .classes.cell_grid import CellGrid
+from .classes.edge_store import EdgeStore
+from .classes.stats import Stats
 
-from .neighbors import is_neighbor
-from .intersections import all_intersections
+from .neighbors import is_neighbor, reach_radius, in_reach, \
+        neighbor_candidates, cell_candidates
+from .intersections import all_intersections, cells_intersections, \
+        pair_bounds_intersections, corner_intersections, \
+        unique_intersections, make_fake_cells
+from .uniform import is_uniform, uniform_polygon, uniform_polygons
+
+if TYPE_CHECKING:
+    from .classes.cell_array import CellArray
+    from .cache_file import Topology
 
 
 class Cache:
-    def __init__(self, options: Options, bounds: Bounds, cells: list[Cell]):
+    def __init__(self, options: Options, bounds: Bounds,
+                 cells: list[Cell] | CellArray, focus: int | None = None,
+                 stored: Topology | None = None):
+        """
+        focus: when given, only the data needed to build the cell at this
+        index is computed (see focus_intersections)
+        stored: neighbors and intersections read from a file, used instead of
+        computing them (see cache_file)
+        """
+
         self.options = options
 
+        # cells stored as arrays compute their edges in bulk, but the rest of
+        # the algorithm works with Cell objects
+        cell_array = None
+        if hasattr(cells, 'edge_table'):
+            cell_array = cast('CellArray', cells)
+            cells = cell_array.to_cells()
+
         # intersections angles as seen from each of their related cells
         self.inter_angles: list[dict[int, float]]
         # list of intersections
@@ -32,32 +59,84 @@ class Cache:
         # Mapping between intersection points and related cells indices, and
         # polygon points (needed since multiple edges can pass through two
         # given intersection points, depending on which cells are at play).
-        # Will be filled on demand.
+        # Will be filled on demand, and an edge is removed once the cells on
+        # both of its sides used it.
         self.edge_cache: dict[tuple[int, int, int, int], list[v2]] = {}
-        # line or circle objects between cells
-        # (some are duplicated, might improve that in the future)
-        self.edge_objects: list[dict[int, Line | Circle]]
-
-        # get neighbor relations, cache edge objects
+        # lines and circles between cells, shared by all the steps
+        self.edges = EdgeStore(cells)
+        # spatial index for closest cell queries
+        self.grid = CellGrid(cells)
+        if stored is not None:
+            self.radii = stored.radii
+            self.neighbors = stored.neighbors
+            self.intersections = stored.intersections
+            self.distribute(cells, make_fake_cells(bounds))
+            return
+
+        stats = Stats.active
+        if stats is not None:
+            start = perf_counter()
+
+        # upper bound of the distance between each cell and its border
+        self.radii = [reach_radius(bounds, cells, self.grid, i, self.edges)
+                      for i in range(len(cells))]
+
+        if focus is not None:
+            self.intersections, fake_cells = \
+                self.focus_intersections(bounds, cells, focus)
+            self.distribute(cells, fake_cells)
+            return
+
+        # get neighbor relations, only looking at the pairs of cells that can
+        # be neighbors
         self.neighbors = [[] for _ in range(len(cells))]
-        self.edge_objects = [{} for _ in range(len(cells))]
+        candidates = neighbor_candidates(bounds, cells, self.grid,
+                                         self.radii)
+
+        # checking neighbors looks at the edges between all the pairs of
+        # cells, only keep the candidates when there are too many of them
+        table = cell_array.all_edge_table() if cell_array is not None \
+            else None
+
+        if table is not None:
+            self.edges.load(table)
+
+        elif cell_array is not None:
+            pairs_i = [i for i, row in enumerate(candidates)
+                       for j in row if i < j]
+            pairs_j = [j for i, row in enumerate(candidates)
+                       for j in row if i < j]
+            self.edges.load(cell_array.edge_table(pairs_i, pairs_j),
+                            pairs_i, pairs_j)
+
+        if options.workers != 1 and len(cells) > 1:
+            from .parallel import parallel_neighbors
+            self.neighbors = parallel_neighbors(options, bounds, cells,
+                                                candidates)
 
-        for i, A in enumerate(cells):
-            for j, B in enumerate(cells):
-                if i == j:
-                    continue
+        else:
+            for i in range(len(cells)):
+                for j in candidates[i]:
+                    if is_neighbor(bounds, cells, i, j, self.edges):
+                        self.neighbors[i].append(j)
 
-                if abs(A.weight - B.weight) < smol:
-                    self.edge_objects[i][j] = perp_bisector(A.pos, B.pos)
-                else:
-                    self.edge_objects[i][j] = get_circle(A, B)
-
-                if is_neighbor(bounds, cells, i, j):
-                    self.neighbors[i].append(j)
+        if stats is not None:
+            start = stats.add_time('neighbors', start)
 
         # get the intersection points and the fake cells
         self.intersections, fake_cells = \
-            all_intersections(bounds, cells, self.neighbors)
+            all_intersections(bounds, cells, self.neighbors, self.grid,
+                              candidates, self.edges)
+
+        self.distribute(cells, fake_cells)
+
+        if stats is not None:
+            stats.add_time('intersections', start)
+
+    def distribute(self, cells: list[Cell], fake_cells: list[FakeCell]):
+        """
+        Sorts the intersections by cell, once they are computed
+        """
 
         self.cells = cells
         self.all_cells = cells+fake_cells
@@ -66,8 +145,8 @@ class Cache:
         self.cells_inter = [[] for _ in range(len(self.all_cells))]
 
         for i, inter in enumerate(self.intersections):
-            for cell in inter.cells:
-                self.cells_inter[self.all_cells.index(cell)].append(i)
+            for k in inter.cells:
+                self.cells_inter[k].append(i)
 
         # cache intersection angles from the center of their cell
         self.inter_angles = [{} for _ in range(len(cells))]
@@ -77,6 +156,64 @@ class Cache:
                 u = self.intersections[inter].pos - A.pos
                 self.inter_angles[i][inter] = atan2(u.y, u.x)
 
+    def focus_intersections(self, bounds: Bounds, cells: list[Cell], m: int
+                            ) -> tuple[list[Intersection], list[FakeCell]]:
+        """
+        Same as the first part of the constructor, only finding the
+        intersections of the cell at index m.
+        The neighbors of m are found, then which of them are neighbors of
+        each other to get the intersections between three cells, and only the
+        edges of m are intersected with the bounds.
+        """
+
+        n = len(cells)
+        row = cell_candidates(cells, self.grid, self.radii, m)
+
+        # neighbors of m, in both directions since only the one starting from
+        # the smallest index is used for the intersections
+        self.neighbors = [[] for _ in range(n)]
+        linked = []
+
+        for j in row:
+            if is_neighbor(bounds, cells, m, j, self.edges):
+                self.neighbors[m].append(j)
+                if m < j:
+                    linked.append(j)
+
+            if j < m and is_neighbor(bounds, cells, j, m, self.edges):
+                self.neighbors[j].append(m)
+                linked.append(j)
+
+        linked.sort()
+        for a, i in enumerate(linked):
+            for j in linked[a+1:]:
+                if in_reach(cells, self.radii, i, j) and \
+                        is_neighbor(bounds, cells, i, j, self.edges):
+                    self.neighbors[i].append(j)
+
+        for neighbors in self.neighbors:
+            neighbors.sort()
+
+        intersections = [inter for inter in cells_intersections(
+            bounds, cells, self.neighbors, self.grid, self.edges)
+            if m in inter.cells]
+
+        # intersections with the bounds, visiting the pairs in the same order
+        # as bounds_intersections to keep the same ones among duplicates
+        bound_inters = []
+        for i in sorted(row + [m]):
+            for j in row if i == m else [m]:
+                bound_inters += pair_bounds_intersections(
+                    bounds, cells, self.grid, self.edges, i, j)
+
+        bound_inters += corner_intersections(bounds, cells, self.grid)
+
+        intersections += [inter for inter in
+                          unique_intersections(bounds, bound_inters, n)
+                          if m in inter.cells]
+
+        return intersections, make_fake_cells(bounds)
+
     def gen_polygon_edge(self, i: int, j: int, m: int, n: int) -> list[v2]:
         """
         Generates the data returned by self.get_polygon_edge when missing.
@@ -92,26 +229,10 @@ class Cache:
         if A is FakeCell or type(B) is FakeCell or \
                 abs(A.weight - B.weight) < smol:
 
-            if not self.options.divide_lines:
-                return [i0.pos, i1.pos]
-
-            diff = i1.pos-i0.pos
-            length = diff.length()
-            N = ceil(length * self.options.segments_density)
-
-            # can happen for very small edges (although the user should try to
-            # avoid them)
-            if not N:
-                N = 1
-
-            points = []
-            for k in range(0, N+1):
-                points.append(i0.pos + diff*(k/N))
-
-            return points
+            return self.line_points(i0.pos, i1.pos)
 
         # arc edges: approximate them with many points
-        circle = cast(Circle, self.edge_objects[m][n])
+        circle = cast(Circle, self.edges.get(m, n))
 
         # get angles from the circle center
         d1, d2 = i0.pos-circle.c, i1.pos-circle.c
@@ -127,17 +248,69 @@ class Cache:
                 a1 += tau
 
         radius = sqrt(circle.r2)
-        N = ceil(abs(a2-a1) * radius * self.options.segments_density)
-        if not N:
-            N = 1
+        N = self.arc_segments(abs(a2-a1), radius, 1)
+
+        return self.arc_points(circle.c, radius, a1, a2, N)
+
+    def arc_segments(self, angle: float, radius: float, least: int) -> int:
+        """
+        Number of segments to subdivide an arc into, at least least, either
+        from the segments density or from the largest allowed distance between
+        the segments and the arc (see Options)
+        """
+
+        error = self.options.arc_error
+
+        # the sagitta of a segment spanning an angle a is radius*(1-cos(a/2))
+        step = 2 * acos(max(1 - error/radius, -1)) if error and radius else 0
+
+        if step:
+            N = ceil(angle / step)
+        else:
+            N = ceil(angle * radius * self.options.segments_density)
+
+        if self.options.max_arc_points:
+            N = min(N, self.options.max_arc_points)
+
+        return max(N, least)
+
+    def line_points(self, P: v2, Q: v2) -> list[v2]:
+        """
+        Points of a straight edge going from P to Q
+        """
+
+        if not self.options.divide_lines:
+            return [P, Q]
+
+        return divide_line(P, Q, self.options.segments_density)
+
+    def arc_points(self, c: v2, radius: float, a1: float, a2: float, N: int
+                   ) -> list[v2]:
+        """
+        N+1 evenly spaced points on a circle, from angle a1 to angle a2
+        """
 
         points = []
         for k in range(0, N+1):
             a = a1 + (a2-a1)*k/N
-            points.append(circle.c + v2(cos(a), sin(a))*radius)
+            points.append(c + v2(cos(a), sin(a))*radius)
 
         return points
 
+    def join_points(self, edges: list[list[v2]], complete_polygon: bool
+                    ) -> list[v2]:
+        """
+        Concatenates the points of the edges of a polygon
+        """
+
+        polygon = [point for edge in edges for point in edge]
+
+        # complete the polygon by going back to the start
+        if complete_polygon:
+            polygon.append(polygon[0])
+
+        return polygon
+
     def get_polygon_edge(self, i: int, j: int, m: int, n: int) -> list[v2]:
         """
         Get the set of points to place between two edges when building a
@@ -147,23 +320,45 @@ class Cache:
         the edge (given because there could be multiple edges using i and j)
         """
 
+        stats = Stats.active
+
         key = (i, j, m, n)
         if key in self.edge_cache:
+            if stats is not None:
+                stats.count('edge_cache_hits')
+
             # remove the last element of the edge since it will be contained in
             # the next edge
             return self.edge_cache[key][:-1]
 
         key = (j, i, m, n)
         if key in self.edge_cache:
+            if stats is not None:
+                stats.count('edge_cache_hits')
+
             # the edge might be cached in a different order, reverse and use it
             points = self.edge_cache[key][::-1]
 
             self.edge_cache[(i, j, m, n)] = points
             return points[:-1]
 
-        # generate new data when needed
+        # the cell on the other side goes around the edge the other way, and
+        # does not need it anymore
+        points = self.edge_cache.pop((j, i, n, m), None)
+        if points is not None:
+            if stats is not None:
+                stats.count('edge_cache_hits')
+
+            return points[:0:-1]
+
+        if stats is not None:
+            stats.count('edge_cache_misses')
+
+        # generate new data when needed, only keeping it for the cell on the
+        # other side, the fake cells of the bounds having no polygons
         points = self.gen_polygon_edge(i, j, m, n)
-        self.edge_cache[(i, j, m, n)] = points
+        if n < len(self.cells):
+            self.edge_cache[(i, j, m, n)] = points
         return points[:-1]
 
     def build_polygon(self, intersections: list[int], m: int,
@@ -179,19 +374,15 @@ class Cache:
         """
 
         # create polygon
-        polygon = []
+        edges = []
 
         length = len(intersections)
         for index, n in zip(range(length), around):
             i, j = intersections[index], intersections[(index+1) % length]
 
-            polygon += self.get_polygon_edge(i, j, m, n)
+            edges.append(self.get_polygon_edge(i, j, m, n))
 
-        # complete the polygon by going back to the start
-        if complete_polygon:
-            polygon.append(polygon[0])
-
-        return polygon
+        return self.join_points(edges, complete_polygon)
 
     def build_circle(self, m: int):
         """
@@ -204,20 +395,12 @@ class Cache:
         # already causes other issues
         n = min(self.neighbors[m], key=lambda j: self.all_cells[j].weight)
 
-        circle = cast(Circle, self.edge_objects[m][n])
+        circle = cast(Circle, self.edges.get(m, n))
 
         radius = sqrt(circle.r2)
-        N = ceil(tau * radius * self.options.segments_density)
+        N = self.arc_segments(tau, radius, 3)
 
-        if N < 3:
-            N = 3
-
-        points = []
-        for k in range(0, N+1):
-            a = tau*k/N
-            points.append(circle.c + v2(cos(a), sin(a))*radius)
-
-        return points
+        return self.arc_points(circle.c, radius, 0, tau, N)
 
 
 def edge_needs_swap(bounds: Bounds, cache: Cache, m: int, n: int,
@@ -242,7 +425,7 @@ def edge_needs_swap(bounds: Bounds, cache: Cache, m: int, n: int,
     else:
         inside, outside = A, B
 
-    edge = cast(Circle, cache.edge_objects[m][n])
+    edge = cast(Circle, cache.edges.get(m, n))
 
     for i in range(0, len(inter), 2):
         i1, i2 = inter[i], inter[i+1]
@@ -270,19 +453,9 @@ def edge_needs_swap(bounds: Bounds, cache: Cache, m: int, n: int,
             return True
 
         # check if the midpoint is next to the right cells
-        closest = A  # dummy value for lsp
-        closest_dist = -1
-
-        for cell in cache.cells:
-            if cell == inside:
-                continue
+        closest = cache.grid.closest(mid, m if inside is A else n)
 
-            dist = get_dist2(cell.pos, mid, cell.weight)
-            if dist < closest_dist or closest_dist == -1:
-                closest_dist = dist
-                closest = cell
-
-        if closest != outside:
+        if cache.cells[closest] != outside:
             return True
 
     return False
@@ -305,8 +478,9 @@ def build_pairs(bounds: Bounds, cache: Cache, m: int, to_visit: list[int]
     # intersections they contribute in
     neighbors: dict[int, list[int]] = {}
     for i in to_visit:
-        for B in cache.intersections[i].cells.difference({A}):
-            n = cache.all_cells.index(B)
+        for n in cache.intersections[i].cells:
+            if n == m:
+                continue
 
             neighbors.setdefault(n, [])
             neighbors[n].append(i)
@@ -344,12 +518,121 @@ def build_pairs(bounds: Bounds, cache: Cache, m: int, to_visit: list[int]
     return pairs
 
 
-def make_polygons(options: Options, bounds: Bounds, cells: list[Cell]
+def build_cell(bounds: Bounds, cache: Cache, m: int) -> list[list[v2]]:
+    """
+    Returns the list of polygons forming the cell of index m in cache.cells
+    """
+
+    stats = Stats.active
+    if stats is not None:
+        start = perf_counter()
+
+    # all the intersection points that need to be processed
+    to_visit = list(cache.cells_inter[m])
+
+    # some cells have no intersection points, draw a circle instead
+    if not to_visit:
+        circle = cache.build_circle(m)
+        if stats is not None:
+            stats.add_time('discretization', start)
+        return [circle]
+
+    polygons = []
+    pairs = build_pairs(bounds, cache, m, to_visit)
+
+    if stats is not None:
+        start = stats.add_time('pairs', start)
+
+    while pairs:
+        first_cell, (i, j) = pairs.pop()
+        # indices of intersection points forming the polygon
+        points: list[int] = [i, j]
+        # corresponding neighboring cells indices used for the edges
+        other_cells: list[int] = [first_cell]
+
+        # Merge all of the sections together, stitching using equal
+        # intersection points wherever possible. When no more changes are
+        # done, this means a cell is split into multiple polygons.
+        # In this case, stop and retry later.
+        while pairs:
+            changes = False
+            a, b = points[0], points[-1]
+
+            for index, (n, (i, j)) in enumerate(pairs):
+                if j == a:
+                    points.insert(0, i)
+                    other_cells.insert(0, n)
+                    changes = True
+                elif i == b:
+                    points.append(j)
+                    other_cells.append(n)
+                    changes = True
+
+                if changes:
+                    pairs.pop(index)
+                    break
+
+            if not changes:
+                break
+
+        if stats is not None:
+            start = stats.add_time('stitching', start)
+
+        # add polygon
+        polygon = cache.build_polygon(points, m, other_cells,
+                                      cache.options.complete_polygons)
+        if len(polygon) > 2:
+            polygons.append(polygon)
+
+        if stats is not None:
+            start = stats.add_time('discretization', start)
+
+    return polygons
+
+
+def new_cache(options: Options, bounds: Bounds,
+              cells: list[Cell] | CellArray, focus: int | None = None
+              ) -> Cache:
+    """
+    Creates the Cache matching the output format asked for in the options,
+    reading its neighbors and intersections from the cache directory of the
+    options when possible
+    """
+
+    # kept separate, since NumPy is optional
+    if options.numpy_output:
+        from .arrays import ArrayCache
+        cache_class = ArrayCache
+    else:
+        cache_class = Cache
+
+    if options.cache_dir is None or focus is not None:
+        return cache_class(options, bounds, cells, focus)
+
+    from .cache_file import topology_key, topology_path, load_topology, \
+        save_topology
+
+    key = topology_key(bounds, cells.to_cells() if hasattr(cells, 'to_cells')
+                       else cells)
+    path = topology_path(options.cache_dir, key)
+
+    stored = load_topology(path, key)
+    cache = cache_class(options, bounds, cells, stored=stored)
+
+    if stored is None:
+        save_topology(path, key, cache)
+
+    return cache
+
+
+def make_polygons(options: Options, bounds: Bounds,
+                  cells: list[Cell] | CellArray
                   ) -> list[tuple[int, list[v2]]]:
     """
     Returns a list of tuples formed with an integer and a polygon.
     The integers refer to the index of the cell that created the polygon.
-    A "polygon" is a list of v2 objects.
+    A "polygon" is a list of v2 objects, or a NumPy array of shape (N, 2)
+    when the numpy_output option is set.
 
     There may be multiple polygons with the same index, as in a weighted
     diagram a cell might be split in multiple distinct parts.
@@ -357,66 +640,110 @@ def make_polygons(options: Options, bounds: Bounds, cells: list[Cell]
     perfect circle. In this case, there is no way to accomodate for the "hole"
     it makes in the larger cell. To accomodate for that, the returned list is
     ordered so that the polygons for larger cells come first in the list.
+
+    cells can also be a CellArray (see classes.cell_array), which requires
+    NumPy.
+    """
+
+    return list(iter_polygons(options, bounds, cells))
+
+
+def iter_polygons(options: Options, bounds: Bounds,
+                  cells: list[Cell] | CellArray
+                  ) -> Iterator[tuple[int, list[v2]]]:
+    """
+    Same as make_polygons, yielding every polygon as soon as its cell is
+    built instead of keeping them all in a list.
+    Polygons come in the same order: cells are built by increasing weight
+    (larger cells first), and by increasing index for equal weights, so that
+    drawing the polygons as they come never covers a cell lying inside
+    another one.
+    The neighbors and intersections of all the cells are still computed
+    before the first polygon.
+    """
+
+    if options.stats is None:
+        yield from gen_polygons(options, bounds, cells)
+        return
+
+    with options.stats.call() as stats:
+        if stats is None:
+            yield from gen_polygons(options, bounds, cells)
+            return
+
+        for m, polygon in stats.run(gen_polygons(options, bounds, cells)):
+            stats.count('polygons')
+            stats.count('vertices', len(polygon))
+            yield m, polygon
+
+
+def gen_polygons(options: Options, bounds: Bounds,
+                 cells: list[Cell] | CellArray
+                 ) -> Iterator[tuple[int, list[v2]]]:
+    """
+    Yields the polygons of iter_polygons, timing the stages when stats are
+    being measured
     """
 
     if not cells:
-        return []
+        return
 
     for cell in cells:
         if not bounds.is_inside(cell.pos):
             raise ValueError(f'Cell {cell} is outside the bounds')
 
-    cache = Cache(options, bounds, cells)
-    polygons: list[tuple[int, list[v2]]]
-    polygons = []
+    # all the edges are straight, use the faster dedicated method
+    if is_uniform(cells):
+        stats = Stats.active
+        if stats is None:
+            yield from uniform_polygons(options, bounds, cells)
+            return
 
-    for m in range(len(cells)):
-        # all the intersection points that need to be processed
-        to_visit = list(cache.cells_inter[m])
+        # only count the time spent building the polygons, not the time
+        # spent by the caller between them
+        start = perf_counter()
+        for polygon in uniform_polygons(options, bounds, cells):
+            stats.add_time('uniform', start)
+            yield polygon
+            start = perf_counter()
 
-        # some cells have no intersection points, draw a circle instead
-        if not to_visit:
-            polygons.append((m, cache.build_circle(m)))
-            continue
+        stats.add_time('uniform', start)
+        return
 
-        pairs = build_pairs(bounds, cache, m, to_visit)
+    cache = new_cache(options, bounds, cells)
+    order = sorted(range(len(cells)), key=lambda m: cells[m].weight)
 
-        while pairs:
-            first_cell, (i, j) = pairs.pop()
-            # indices of intersection points forming the polygon
-            points: list[int] = [i, j]
-            # corresponding neighboring cells indices used for the edges
-            other_cells: list[int] = [first_cell]
-
-            # Merge all of the sections together, stitching using equal
-            # intersection points wherever possible. When no more changes are
-            # done, this means a cell is split into multiple polygons.
-            # In this case, stop and retry later.
-            while pairs:
-                changes = False
-                a, b = points[0], points[-1]
-
-                for index, (n, (i, j)) in enumerate(pairs):
-                    if j == a:
-                        points.insert(0, i)
-                        other_cells.insert(0, n)
-                        changes = True
-                    elif i == b:
-                        points.append(j)
-                        other_cells.append(n)
-                        changes = True
-
-                    if changes:
-                        pairs.pop(index)
-                        break
-
-                if not changes:
-                    break
+    if options.workers != 1 and len(cells) > 1:
+        from .parallel import parallel_polygons
+        yield from parallel_polygons(bounds, cache, order)
+
+    else:
+        for m in order:
+            for polygon in build_cell(bounds, cache, m):
+                yield m, polygon
+
+
+def cell_polygons(options: Options, bounds: Bounds,
+                  cells: list[Cell] | CellArray, m: int) -> list[list[v2]]:
+    """
+    Returns the polygons of the cell at index m, the same as the ones with
+    index m returned by make_polygons, for example to find the region of a
+    single cell.
+    Only the neighbors and intersections around that cell are computed,
+    instead of the ones of the whole diagram.
+    """
+
+    if not 0 <= m < len(cells):
+        raise IndexError(f'No cell at index {m}')
+
+    for cell in cells:
+        if not bounds.is_inside(cell.pos):
+            raise ValueError(f'Cell {cell} is outside the bounds')
+
+    if is_uniform(cells):
+        polygon = uniform_polygon(options, bounds, cells, CellGrid(cells), m)
+        return [polygon] if len(polygon) > 2 else []
 
-            # add polygon
-            polygon = cache.build_polygon(points, m, other_cells,
-                                          options.complete_polygons)
-            if len(polygon) > 2:
-                polygons.append((m, polygon))
+    cache = new_cache(options, bounds, cells, m)
 
-    return sorted(polygons, key=lambda p: cells[p[0]].weight)
+    return build_cell(bounds, cache, m)
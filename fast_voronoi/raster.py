@@ -0,0 +1,201 @@
+import numpy as np
+from os import cpu_count
+from concurrent.futures import ProcessPoolExecutor
+
+from .classes.v2 import v2
+from .classes.cell import Cell
+from .classes.bounds import Bounds
+from .classes.cell_array import CellArray
+
+from .locate import as_cell_array, rect_candidates
+from .parallel import worker_state
+
+# default size of the square tiles, in samples
+default_tile = 256
+
+
+def label_tile(positions: np.ndarray, weights: np.ndarray, xs: np.ndarray,
+               ys: np.ndarray) -> np.ndarray:
+    """
+    Returns the index of the closest cell to every point of the grid formed
+    by xs and ys, as an array of shape (len(ys), len(xs)).
+    Only the cells that can be the closest to a point of the tile are looked
+    at, and distances are computed the same way as utils.get_dist2 so that
+    the result matches utils.closest_cell.
+    """
+
+    rect = np.array(((xs[0], ys[0], xs[-1], ys[-1]),))
+    indices = np.flatnonzero(rect_candidates(positions, weights, rect)[0])
+
+    best = np.full((len(ys), len(xs)), np.inf)
+    labels = np.zeros((len(ys), len(xs)), dtype=np.intp)
+
+    for i in indices.tolist():
+        (x, y), w = positions[i], weights[i]
+        dx, dy = (x-xs) * w, (y-ys) * w
+        dist = (dy*dy)[:, None] + (dx*dx)[None, :]
+
+        # strictly closer only, ties go to the smallest index
+        closer = dist < best
+        best[closer] = dist[closer]
+        labels[closer] = i
+
+    return labels
+
+
+def init_raster_worker(positions: np.ndarray, weights: np.ndarray):
+    worker_state['positions'] = positions
+    worker_state['weights'] = weights
+
+
+def raster_tile(tile: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    return label_tile(worker_state['positions'], worker_state['weights'],
+                      *tile)
+
+
+def rasterize_labels(cells: list[Cell] | CellArray, width: int, height: int,
+                     step: int = 1, workers: int = 1,
+                     tile: int = default_tile) -> np.ndarray:
+    """
+    Returns an integer array of shape (height, width) holding the index of
+    the cell every pixel belongs to, taking weights into account. Requires
+    NumPy.
+    Like testing/bad_voronoi.py, the image is split into squares of step
+    pixels, and the whole square gets the label of its center.
+
+    Squares are grouped into tiles of tile*tile squares, computed one at a
+    time against the cells that can be the closest to them. workers spreads
+    the tiles over that many processes, 0 meaning one per processor.
+    """
+
+    cells = as_cell_array(cells)
+    positions, weights = cells.positions, cells.weights
+
+    if not len(positions):
+        raise ValueError('Cannot rasterize without cells')
+    if step < 1:
+        raise ValueError('step should be at least 1')
+
+    # centers of the squares
+    xs = np.arange(0, width, step) + step*.5
+    ys = np.arange(0, height, step) + step*.5
+
+    tiles = [(xs[x:x+tile], ys[y:y+tile])
+             for y in range(0, len(ys), tile)
+             for x in range(0, len(xs), tile)]
+
+    if not tiles:
+        return np.zeros((max(height, 0), max(width, 0)), dtype=np.intp)
+
+    workers = workers or cpu_count() or 1
+
+    if workers == 1 or len(tiles) < 2:
+        results = [label_tile(positions, weights, *t) for t in tiles]
+
+    else:
+        with ProcessPoolExecutor(workers, initializer=init_raster_worker,
+                                 initargs=(positions, weights)) as pool:
+            results = list(pool.map(raster_tile, tiles))
+
+    columns = -(-len(xs) // tile)
+    labels = np.block([results[k:k+columns]
+                       for k in range(0, len(results), columns)])
+
+    # spread the labels of the squares over their pixels
+    if step > 1:
+        labels = labels.repeat(step, axis=0).repeat(step, axis=1)
+
+    return labels[:height, :width]
+
+
+def fill_polygon(buffer: np.ndarray, polygon: np.ndarray, value,
+                 nonzero: bool):
+    """
+    Sets value in all the pixels of buffer whose center is inside polygon,
+    an array of shape (N, 2) in pixel coordinates.
+    Every row of pixels counts the edges crossed on its left, only the sign
+    of the crossings being kept with the non-zero rule, and the crossings
+    are accumulated along the row to find the pixels inside.
+    """
+
+    height, width = buffer.shape[:2]
+
+    x0, y0 = polygon[:, 0], polygon[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+
+    # pixels whose center is inside the bounding box of the polygon
+    r0 = max(int(np.ceil(y0.min() - .5)), 0)
+    r1 = min(int(np.floor(y0.max() - .5)) + 1, height)
+    c0 = max(int(np.ceil(x0.min() - .5)), 0)
+    c1 = min(int(np.floor(x0.max() - .5)) + 1, width)
+
+    if r0 >= r1 or c0 >= c1:
+        return
+
+    # crossings between the edges and the horizontal lines through the
+    # centers of the rows, edges being closed at the bottom only
+    ys = np.arange(r0, r1) + .5
+    rows, edges = np.nonzero((y0 <= ys[:, None]) != (y1 <= ys[:, None]))
+
+    t = (ys[rows] - y0[edges]) / (y1[edges] - y0[edges])
+    xs = x0[edges] + t*(x1[edges] - x0[edges])
+
+    # first pixel of the row whose center is right of the crossing
+    columns = np.clip(np.floor(xs - .5).astype(np.intp) + 1, c0, c1) - c0
+
+    if nonzero:
+        crossings = np.where(y1[edges] > y0[edges], 1, -1)
+    else:
+        crossings = 1
+
+    counts = np.zeros((r1-r0, c1-c0+1), dtype=np.intp)
+    np.add.at(counts, (rows, columns), crossings)
+    counts = np.cumsum(counts, axis=1)[:, :-1]
+
+    inside = counts != 0 if nonzero else counts % 2 == 1
+    buffer[r0:r1, c0:c1][inside] = value
+
+
+def fill_polygons(buffer: np.ndarray, polygons: list[tuple[int, list[v2]]],
+                  values=None, bounds: Bounds | None = None,
+                  rule: str = 'evenodd') -> np.ndarray:
+    """
+    Draws the polygons returned by make_polygons in buffer, a NumPy array of
+    shape (H, W) or (H, W, channels), and returns it. A pixel is filled when
+    its center is inside a polygon.
+    The pixels of every polygon are set to values[index], for example a
+    color, or to the index of its cell when values is not given.
+    Polygons are drawn in the given order, so that with the one of
+    make_polygons, cells completely inside a larger one are drawn over it.
+
+    bounds is the area covered by buffer, in the coordinates of the
+    polygons, which are used as pixel coordinates otherwise.
+    rule is 'evenodd' or 'nonzero', telling which pixels are inside polygons
+    crossing themselves.
+    """
+
+    if rule not in ('evenodd', 'nonzero'):
+        raise ValueError(f'Unknown fill rule: {rule}')
+
+    height, width = buffer.shape[:2]
+
+    if bounds is None:
+        origin, scale = np.zeros(2), np.ones(2)
+    else:
+        origin = np.array((bounds.x, bounds.y))
+        scale = np.array((width / bounds.w, height / bounds.h))
+
+    for m, polygon in polygons:
+        if isinstance(polygon, np.ndarray):
+            points = polygon.astype(np.float64)
+        else:
+            points = np.array([(X.x, X.y) for X in polygon],
+                              dtype=np.float64).reshape(-1, 2)
+
+        if len(points) < 3:
+            continue
+
+        fill_polygon(buffer, (points-origin) * scale,
+                     m if values is None else values[m], rule == 'nonzero')
+
+    return buffer
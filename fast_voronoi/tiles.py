@@ -0,0 +1,244 @@
+from copy import copy
+from math import sqrt, ceil, floor
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+from .utils import clip_polygon
+
+from .classes.v2 import v2
+from .classes.cell import Cell
+from .classes.bounds import Bounds
+from .classes.options import Options
+from .classes.cell_grid import CellGrid
+
+from .neighbors import reach_samples
+from .polygons import iter_polygons
+from .parallel import worker_count
+
+# how many of the closest cells to the center of a tile are used to bound
+# the distance to its points
+bound_samples = 8
+# largest number of pieces along each side of a tile when finding its cells
+max_pieces = 16
+
+
+def reaching_cells(rect: Bounds, cells: list[Cell], grid: CellGrid,
+                   exclude: int = -1) -> list[int]:
+    """
+    Returns the indices of the cells that can be the closest one to a point
+    of the rectangle, taking weights into account and optionally ignoring
+    the cell at index exclude.
+    The largest weighted distance between a few nearby cells and the
+    rectangle bounds the distance between its points and their closest cell,
+    so any cell whose smallest weighted distance to it is larger can be left
+    out.
+    """
+
+    def near(A: Cell) -> float:
+        dx = max(rect.left - A.pos.x, A.pos.x - rect.right, 0)
+        dy = max(rect.top - A.pos.y, A.pos.y - rect.bottom, 0)
+        return sqrt(dx*dx + dy*dy) * A.weight
+
+    def far(A: Cell) -> float:
+        dx = max(A.pos.x - rect.left, rect.right - A.pos.x)
+        dy = max(A.pos.y - rect.top, rect.bottom - A.pos.y)
+        return sqrt(dx*dx + dy*dy) * A.weight
+
+    center = v2(rect.x + rect.w*.5, rect.y + rect.h*.5)
+    bound = min(far(cells[i])
+                for i in grid.nearest(center, bound_samples, exclude))
+
+    # leave some room for rounding errors
+    bound *= 1+1e-9
+
+    # a cell farther than that from the center is farther from the rectangle
+    # than bound, even with the smallest weight
+    radius = sqrt(rect.w*rect.w + rect.h*rect.h)*.5 + bound/grid.min_weight
+
+    return [i for i in grid.within(center, radius)
+            if i != exclude and near(cells[i]) <= bound]
+
+
+def piece_cells(tile: Bounds, cells: list[Cell], grid: CellGrid,
+                exclude: int = -1) -> list[list[int]]:
+    """
+    Splits the tile into pieces about the size of the buckets of the grid,
+    so that the bound used by reaching_cells stays close to the distance
+    between the cells, and returns the cells that can be the closest one to
+    a point of every piece, optionally ignoring the cell at index exclude
+    """
+
+    columns = max(min(ceil(tile.w / grid.size), max_pieces), 1)
+    rows = max(min(ceil(tile.h / grid.size), max_pieces), 1)
+    w, h = tile.w / columns, tile.h / rows
+
+    return [reaching_cells(Bounds(tile.x + c*w, tile.y + r*h, w, h), cells,
+                           grid, exclude)
+            for r in range(rows) for c in range(columns)]
+
+
+def halo_cells(tile: Bounds, cells: list[Cell], grid: CellGrid,
+               exclude: int = -1) -> list[int]:
+    """
+    Returns the indices of the cells that can be the closest one to a point
+    of the tile, which give the exact diagram inside of it, optionally
+    ignoring the cell at index exclude (see piece_cells)
+    """
+
+    found = set()
+    for piece in piece_cells(tile, cells, grid, exclude):
+        found.update(piece)
+
+    return sorted(found)
+
+
+def cutting_cells(bounds: Bounds, cells: list[Cell], grid: CellGrid,
+                  radii: list[float], i: int, j: int,
+                  memo: dict[tuple[int, int], list[int]] | None = None
+                  ) -> list[int]:
+    """
+    Returns the indices of the cells that can cut the edge between the cells
+    at indices i and j, given their reach radii (see neighbors.reach_radius).
+    Past the reach radius of one of the cells, the edge is cut by the nearby
+    cells used to find it, and inside of both, by the cells that can be the
+    closest one there, found for every bucket of the grid. memo can be given
+    to share these between calls while the cells do not change.
+    """
+
+    if memo is None:
+        memo = {}
+
+    found = set()
+    x0, y0, x1, y1 = bounds.left, bounds.top, bounds.right, bounds.bottom
+
+    for k in (i, j):
+        pos, radius = cells[k].pos, radii[k]
+        found.update(grid.nearest(pos, reach_samples, k))
+
+        x0, y0 = max(x0, pos.x - radius), max(y0, pos.y - radius)
+        x1, y1 = min(x1, pos.x + radius), min(y1, pos.y + radius)
+
+    if x0 > x1 or y0 > y1:
+        return sorted(found)
+
+    size = grid.size
+    for bx in range(floor((x0-grid.x0) / size),
+                    floor((x1-grid.x0) / size) + 1):
+        for by in range(floor((y0-grid.y0) / size),
+                        floor((y1-grid.y0) / size) + 1):
+            if (bx, by) not in memo:
+                memo[bx, by] = reaching_cells(
+                    Bounds(grid.x0 + bx*size, grid.y0 + by*size, size, size),
+                    cells, grid)
+
+            found.update(memo[bx, by])
+
+    return sorted(found)
+
+
+def tile_polygons(options: Options, tile: Bounds, cells: list[Cell]
+                  ) -> list[tuple[int, list[v2]]]:
+    """
+    Builds the polygons of the given cells, clipped to the tile.
+    The cells can be outside of the tile, so the diagram is computed in
+    slightly larger bounds around all of them.
+    """
+
+    xs = [cell.pos.x for cell in cells] + [tile.left, tile.right]
+    ys = [cell.pos.y for cell in cells] + [tile.top, tile.bottom]
+    x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+
+    margin = max(x1-x0, y1-y0) * .01 or 1
+    area = Bounds(x0-margin, y0-margin, x1-x0 + 2*margin, y1-y0 + 2*margin)
+
+    # clipping works on open lists of v2, the options are applied afterwards
+    tile_options = copy(options)
+    tile_options.workers = 1
+    tile_options.complete_polygons = False
+    tile_options.numpy_output = False
+
+    if options.numpy_output:
+        import numpy as np
+
+    sides = ((tile.tl, v2(-1, 0)), (tile.tl, v2(0, -1)),
+             (tile.br, v2(1, 0)), (tile.br, v2(0, 1)))
+
+    polygons = []
+    for m, polygon in iter_polygons(tile_options, area, cells):
+        # clipping a concave polygon can leave edges going back and forth
+        # along the sides, which do not change its area
+        for M, n in sides:
+            if polygon:
+                polygon = clip_polygon(polygon, M, n)
+
+        if len(polygon) < 3:
+            continue
+
+        if options.complete_polygons:
+            polygon.append(polygon[0])
+
+        if options.numpy_output:
+            polygon = np.array([(X.x, X.y) for X in polygon])
+
+        polygons.append((m, polygon))
+
+    return polygons
+
+
+def tiled_polygons(options: Options, bounds: Bounds, cells: list[Cell],
+                   columns: int, rows: int) -> list[tuple[int, list[v2]]]:
+    """
+    Same as make_polygons, splitting the bounds into a grid of columns*rows
+    tiles computed on their own, for diagrams with many cells.
+    Every tile only uses its cells and the ones around it that can reach it
+    (see halo_cells), so that the total work grows about linearly with the
+    number of tiles. Tiles are spread over processes with the workers option.
+
+    The polygons of a cell are clipped to every tile it covers, so a cell
+    across several tiles is made of several polygons sharing their index.
+    They are ordered like in make_polygons.
+    """
+
+    if hasattr(cells, 'to_cells'):
+        cells = cells.to_cells()
+
+    if columns < 1 or rows < 1:
+        raise ValueError('tiled_polygons needs at least one column and row')
+
+    if not cells:
+        return []
+
+    for cell in cells:
+        if not bounds.is_inside(cell.pos):
+            raise ValueError(f'Cell {cell} is outside the bounds')
+
+    grid = CellGrid(cells)
+
+    xs = [bounds.x + bounds.w*k/columns for k in range(columns+1)]
+    ys = [bounds.y + bounds.h*k/rows for k in range(rows+1)]
+    tiles = [Bounds(xs[c], ys[r], xs[c+1]-xs[c], ys[r+1]-ys[r])
+             for r in range(rows) for c in range(columns)]
+
+    halos = [halo_cells(tile, cells, grid) for tile in tiles]
+    subsets = [[cells[i] for i in halo] for halo in halos]
+
+    workers = worker_count(options)
+
+    if workers == 1 or len(tiles) == 1:
+        results = list(map(tile_polygons, repeat(options), tiles, subsets))
+
+    else:
+        # what happens in other processes is not measured, and the callback
+        # of the stats might not be picklable
+        options = copy(options)
+        options.stats = None
+
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(tile_polygons, repeat(options), tiles,
+                                    subsets))
+
+    # back to the indices of all the cells
+    polygons = [(halo[m], polygon) for halo, result in zip(halos, results)
+                for m, polygon in result]
+
+    return sorted(polygons, key=lambda p: (cells[p[0]].weight, p[0]))
@@ -0,0 +1,160 @@
+from typing import Iterator
+
+from .utils import smol, get_dist2, divide_line, clip_polygon
+
+from .classes.v2 import v2
+from .classes.cell import Cell
+from .classes.bounds import Bounds
+from .classes.options import Options
+from .classes.cell_grid import CellGrid
+from .classes.cell_tree import CellTree
+
+# how many of the closest cells to look at first when building a cell
+first_samples = 8
+# largest batch of closest cells, before checking the corners one by one
+max_samples = 64
+
+
+def is_uniform(cells: list[Cell]) -> bool:
+    """
+    Checks if all the cells have the same weight, in which case all the edges
+    are perpendicular bisectors
+    """
+
+    weights = [cell.weight for cell in cells]
+
+    return max(weights) - min(weights) < smol
+
+
+def uniform_cell(bounds: Bounds, cells: list[Cell], grid: CellGrid,
+                 i: int, tree: CellTree | None = None) -> list[v2]:
+    """
+    Returns the corners of the cell at index i, when all the cells have the
+    same weight.
+    The cell is a convex polygon, built by clipping the bounds with the
+    perpendicular bisectors with the closest cells first. A cell farther than
+    twice the farthest corner of the polygon cannot clip it anymore, so the
+    cells are looked at in growing batches until that happens.
+
+    Long cells, like the ones of cells along a line, have corners much
+    farther than their closest cells. Past max_samples cells, the remaining
+    corners are checked on their own with tree: the polygon is final once no
+    cell is closer to any of its corners than cells[i].
+    """
+
+    A = cells[i]
+    polygon = list(bounds.corners)
+
+    used = 0
+    count = first_samples
+
+    while True:
+        closest = grid.nearest(A.pos, count, i)
+
+        for k in closest[used:]:
+            P = cells[k]
+            polygon = clip_polygon(polygon, (A.pos+P.pos) * .5, P.pos-A.pos)
+
+        used = len(closest)
+        if used < count:
+            return unique_corners(polygon)
+
+        reach2 = max((X-A.pos).dot() for X in polygon)
+        last2 = get_dist2(cells[closest[-1]].pos, A.pos)
+        if last2 >= 4*reach2:
+            return unique_corners(polygon)
+
+        if count >= max_samples:
+            break
+
+        count *= 2
+
+    if tree is None:
+        tree = CellTree(cells)
+
+    # corners closer than half the distance to the last closest cell cannot
+    # be clipped by the cells left
+    skip = set(closest) | {i}
+    checked = set()
+
+    k = 0
+    while k < len(polygon):
+        X = polygon[k]
+        dist2 = (X-A.pos).dot()
+
+        if 4*dist2 <= last2 or (X.x, X.y) in checked:
+            k += 1
+            continue
+
+        j = tree.closest_within(X, dist2, skip)
+        if j == -1:
+            checked.add((X.x, X.y))
+            k += 1
+            continue
+
+        # clipping only removes corners or adds new ones, so the checked
+        # corners stay valid
+        P = cells[j]
+        polygon = clip_polygon(polygon, (A.pos+P.pos) * .5, P.pos-A.pos)
+        skip.add(j)
+        k = 0
+
+    return unique_corners(polygon)
+
+
+def unique_corners(polygon: list[v2]) -> list[v2]:
+    """
+    Removes the duplicate corners clipping can create
+    """
+
+    return [X for k, X in enumerate(polygon)
+            if get_dist2(X, polygon[k-1]) > smol*smol]
+
+
+def uniform_polygon(options: Options, bounds: Bounds, cells: list[Cell],
+                    grid: CellGrid, i: int, tree: CellTree | None = None
+                    ) -> list[v2]:
+    """
+    Builds the polygon of the cell at index i from its corners (see
+    uniform_cell), following the options like Cache.build_polygon
+    """
+
+    corners = uniform_cell(bounds, cells, grid, i, tree)
+
+    if options.numpy_output:
+        from .arrays import polygon_array
+        return polygon_array(corners, options)
+
+    if options.divide_lines:
+        polygon = []
+        for k, X in enumerate(corners):
+            Y = corners[(k+1) % len(corners)]
+            polygon += divide_line(X, Y, options.segments_density)[:-1]
+
+    else:
+        polygon = corners
+
+    if options.complete_polygons and polygon:
+        polygon.append(polygon[0])
+
+    return polygon
+
+
+def uniform_polygons(options: Options, bounds: Bounds, cells: list[Cell]
+                     ) -> Iterator[tuple[int, list[v2]]]:
+    """
+    Same as polygons.iter_polygons, but only valid when all the cells have
+    the same weight (see is_uniform).
+    Every cell is computed on its own from its closest cells, using a spatial
+    index, which avoids computing the neighbors and intersections of all the
+    cells.
+    """
+
+    grid = CellGrid(cells)
+    tree = CellTree(cells)
+
+    for i in range(len(cells)):
+        polygon = uniform_polygon(options, bounds, cells, grid, i, tree)
+
+        if len(polygon) > 2:
+            yield i, polygon
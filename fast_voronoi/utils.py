@@ -1,7 +1,8 @@
-from math import sqrt
+from math import sqrt, ceil
 from .classes.v2 import v2
 from .classes.line import Line
 from .classes.cell import Cell
+from .classes.stats import Stats
 from .classes.circle import Circle
 
 smol = 1e-9
@@ -36,6 +37,9 @@ def closest_cell(cells: list[Cell], pos: v2) -> int:
     taking their weight into account
     """
 
+    if Stats.active is not None:
+        Stats.active.count('closest_cell')
+
     closest = None
     closest_i = -1
 
@@ -48,26 +52,57 @@ def closest_cell(cells: list[Cell], pos: v2) -> int:
     return closest_i
 
 
+def closest_to_line_xy(mx: float, my: float, ux: float, uy: float,
+                       x: float, y: float) -> tuple[float, float]:
+    """
+    same as get_closest_to_line, for a line (mx, my), (ux, uy) and a point
+    (x, y) given as floats
+    """
+
+    t = ux*(x-mx) + uy*(y-my)
+
+    return mx + ux*t, my + uy*t
+
+
 def get_closest_to_line(line: Line, P: v2) -> v2:
     """
     returns the closest point to P that is inside the given line
     """
 
-    dap = v2(P.x-line.M.x, P.y-line.M.y)
-    t = line.u.x*dap.x + line.u.y*dap.y
+    return v2(*closest_to_line_xy(line.M.x, line.M.y, line.u.x, line.u.y,
+                                  P.x, P.y))
 
-    return v2(line.M.x + line.u.x*t, line.M.y + line.u.y*t)
+
+def perp_bisector_xy(xa: float, ya: float, xb: float, yb: float
+                     ) -> tuple[float, float, float, float]:
+    """
+    same as perp_bisector, returns the line as (mx, my, ux, uy)
+    """
+
+    dx, dy = xb-xa, yb-ya
+
+    dist_inv = 1 / sqrt(dx*dx + dy*dy)
+
+    return (xa+xb) * .5, (ya+yb) * .5, dy*dist_inv, -dx*dist_inv
 
 
 def perp_bisector(A: v2, B: v2) -> Line:
-    dx, dy = B.x-A.x, B.y-A.y
+    mx, my, ux, uy = perp_bisector_xy(A.x, A.y, B.x, B.y)
 
-    mid = (A+B) * .5
+    return Line(v2(mx, my), v2(ux, uy))
 
-    dist_inv = 1 / sqrt(dx*dx + dy*dy)
-    u = v2(dy*dist_inv, -dx*dist_inv)
 
-    return Line(mid, u)
+def get_t_xy(mx: float, my: float, ux: float, uy: float,
+             x: float, y: float) -> float:
+    """
+    same as get_t, for a line (mx, my), (ux, uy) and a point (x, y) given as
+    floats
+    """
+
+    if abs(ux) < abs(uy):
+        return (y-my) / uy
+
+    return (x-mx) / ux
 
 
 def get_t(line: Line, P: v2) -> float:
@@ -76,10 +111,7 @@ def get_t(line: Line, P: v2) -> float:
     and t = 1 is at M+u.
     """
 
-    if abs(line.u.x) < abs(line.u.y):
-        return (P.y-line.M.y) / line.u.y
-
-    return (P.x-line.M.x) / line.u.x
+    return get_t_xy(line.M.x, line.M.y, line.u.x, line.u.y, P.x, P.y)
 
 
 def quadratic(a: float, b: float, c: float) -> list[float]:
@@ -100,60 +132,121 @@ def quadratic(a: float, b: float, c: float) -> list[float]:
     ]
 
 
-### More intricate math utils
+def divide_line(A: v2, B: v2, density: float) -> list[v2]:
+    """
+    Splits the segment [AB] into evenly spaced points, with about density
+    points per unit of length, including both A and B
+    """
 
+    diff = B-A
+    N = ceil(diff.length() * density)
 
-def get_equidistant(A: v2, B: v2, C: v2) -> v2 | None:
-    """
-    Let (a) be the perpendicular bisector between A and B, (b) the one between
-    A and C, and X the point equidistant to A, B and C.
+    # can happen for very small edges (although the user should try to
+    # avoid them)
+    if not N:
+        N = 1
 
-    Returns X, computed as the intersection between (a) and (b).
-    Returns None if the two lines are parallel.
+    return [A + diff*(k/N) for k in range(0, N+1)]
+
+
+def clip_polygon(polygon: list[v2], M: v2, n: v2) -> list[v2]:
     """
+    Clips a convex polygon by a half-plane, only keeping the points X such that
+    (X-M).n <= 0
+    """
+
+    clipped = []
+
+    Q = polygon[-1]
+    dq = (Q.x-M.x)*n.x + (Q.y-M.y)*n.y
+
+    for P in polygon:
+        dp = (P.x-M.x)*n.x + (P.y-M.y)*n.y
+
+        # add the point where the edge crosses the border of the half-plane
+        if dp < 0 < dq or dq < 0 < dp:
+            t = dq / (dq-dp)
+            clipped.append(v2(Q.x + (P.x-Q.x)*t, Q.y + (P.y-Q.y)*t))
+
+        if dp <= 0:
+            clipped.append(P)
 
-    a = perp_bisector(A, B)
-    b = perp_bisector(A, C)
-    u, v = a.u, b.u
-    M, N = a.M, b.M
+        Q, dq = P, dp
+
+    return clipped
+
+
+### More intricate math utils
+
+
+def line_inter_xy(mx: float, my: float, ux: float, uy: float,
+                  nx: float, ny: float, vx: float, vy: float
+                  ) -> tuple[float, float] | None:
+    """
+    returns the intersection between the lines (mx, my), (ux, uy) and
+    (nx, ny), (vx, vy), or None if they are parallel
+    """
 
     # handle when A, B and C are aligned: no equidistant point
     # (except in very rare scenarios that it is easier to ignore)
-    if abs(u.x*v.y - u.y*v.x) < smol:
+    if abs(ux*vy - uy*vx) < smol:
         return None
 
     # find t, or how far down one line the intersection point is
     # multiple definitions of t exist: either how far down (a), or (b) t is
     # this should help avoid divisions by zero (when dividing by v.x or v.y)
-    if abs(v.x) < abs(v.y):
-        mv = v.x/v.y
+    if abs(vx) < abs(vy):
+        mv = vx/vy
 
         # another potential division by zero, however that should not happen
         # either, since for div to be 0, u and v have to be colinear,
         # which has already been checked above
-        div = u.x - mv*u.y
+        div = ux - mv*uy
 
-        t = (N.x - M.x + mv * (M.y-N.y)) / div
+        t = (nx - mx + mv * (my-ny)) / div
 
     else:
-        mv = v.y/v.x
-        div = u.y - mv*u.x
+        mv = vy/vx
+        div = uy - mv*ux
 
-        t = (N.y - M.y + mv * (M.x-N.x)) / div
+        t = (ny - my + mv * (mx-nx)) / div
 
-    return v2(M.x + u.x*t, M.y + u.y*t)
+    return mx + ux*t, my + uy*t
 
 
-def get_circle(A: Cell, B: Cell) -> Circle:
+def equidistant_xy(xa: float, ya: float, xb: float, yb: float,
+                   xc: float, yc: float) -> tuple[float, float] | None:
     """
-    Finds the circle defined from the intersection
-    of two differently weighted cells
+    same as get_equidistant, for points given as floats
     """
 
-    # cache some useful variables
-    xa, ya = A.pos.x, A.pos.y
-    xb, yb = B.pos.x, B.pos.y
-    wa2, wb2 = A.weight*A.weight, B.weight*B.weight
+    return line_inter_xy(*perp_bisector_xy(xa, ya, xb, yb),
+                         *perp_bisector_xy(xa, ya, xc, yc))
+
+
+def get_equidistant(A: v2, B: v2, C: v2) -> v2 | None:
+    """
+    Let (a) be the perpendicular bisector between A and B, (b) the one between
+    A and C, and X the point equidistant to A, B and C.
+
+    Returns X, computed as the intersection between (a) and (b).
+    Returns None if the two lines are parallel.
+    """
+
+    X = equidistant_xy(A.x, A.y, B.x, B.y, C.x, C.y)
+
+    return None if X is None else v2(*X)
+
+
+def get_circle_xy(xa: float, ya: float, wa: float,
+                  xb: float, yb: float, wb: float
+                  ) -> tuple[float, float, float]:
+    """
+    same as get_circle, for cells given as positions and weights, returns the
+    circle as (cx, cy, r2)
+    """
+
+    wa2, wb2 = wa*wa, wb*wb
 
     # first stage: find a set of polynomials, one for x and one for y,
     # defining the boundary between the two cells
@@ -180,21 +273,27 @@ def get_circle(A: Cell, B: Cell) -> Circle:
     gamma_y = c_y/a - alpha_y*alpha_y
 
     # extract the circle center and squared radius from this circle equation
-    pos = v2(-alpha_x, -alpha_y)
-    r2 = -gamma_x-gamma_y
-
-    return Circle(pos, r2)
+    return -alpha_x, -alpha_y, -gamma_x-gamma_y
 
 
-def circle_inter(ca: Circle, cb: Circle) -> list[v2]:
+def get_circle(A: Cell, B: Cell) -> Circle:
     """
-    Computes the list of intersections between two circles
+    Finds the circle defined from the intersection
+    of two differently weighted cells
     """
 
-    # warning: the radii are squared
-    a1, b1 = ca.c
-    r1, r2 = ca.r2, cb.r2
-    a2, b2 = cb.c
+    cx, cy, r2 = get_circle_xy(A.pos.x, A.pos.y, A.weight,
+                               B.pos.x, B.pos.y, B.weight)
+
+    return Circle(v2(cx, cy), r2)
+
+
+def circle_inter_xy(a1: float, b1: float, r1: float,
+                    a2: float, b2: float, r2: float
+                    ) -> list[tuple[float, float]]:
+    """
+    same as circle_inter, for circles given as (center x, center y, r2)
+    """
 
     # cache a few useful variables
     da, db = a2-a1, b1-b2
@@ -222,20 +321,110 @@ def circle_inter(ca: Circle, cb: Circle) -> list[v2]:
 
     # find the full 2D positions of the solutions
     if x_first:
-        return [v2(x, (2*db*x + rest) / (2*da)) for x in solutions]
-    return [v2((2*db*y + rest) / (2*da), y) for y in solutions]
+        return [(x, (2*db*x + rest) / (2*da)) for x in solutions]
+    return [((2*db*y + rest) / (2*da), y) for y in solutions]
 
 
-def circle_inter_line(line: Line, circle: Circle) -> list[v2]:
+def circle_inter(ca: Circle, cb: Circle) -> list[v2]:
     """
-    Computes the list of intersections between a line and a circle
+    Computes the list of intersections between two circles
     """
 
-    # cache a few useful variables
-    x0, y0 = line.M
-    xu, yu = line.u
-    xc, yc = circle.c
-    r2 = circle.r2
+    # warning: the radii are squared
+    return [v2(x, y) for x, y in circle_inter_xy(ca.c.x, ca.c.y, ca.r2,
+                                                 cb.c.x, cb.c.y, cb.r2)]
+
+
+def farthest_in_discs(polygon: list[v2],
+                      inside: list[tuple[float, float, float]],
+                      outside: list[tuple[float, float, float]],
+                      x: float, y: float) -> tuple[float, float, float]:
+    """
+    Finds the farthest point from (x, y) among the points of a convex polygon
+    that are inside all the discs of inside and outside all the discs of
+    outside, given as (cx, cy, r2).
+    Returns its distance and its coordinates, or 0, x, y when there are no
+    such points.
+    The farthest point is either a corner of that area, where the sides of
+    the polygon and the circles cross, or the farthest point of a circle.
+    """
+
+    circles = inside + outside
+
+    def kept(px: float, py: float, on_polygon: bool) -> bool:
+        # points on a circle are kept, rounding errors can only make the
+        # result larger
+        for cx, cy, r2 in inside:
+            if (px-cx)*(px-cx) + (py-cy)*(py-cy) > r2 * (1+1e-9):
+                return False
+        for cx, cy, r2 in outside:
+            if (px-cx)*(px-cx) + (py-cy)*(py-cy) < r2 * (1-1e-9):
+                return False
+
+        if on_polygon:
+            return True
+
+        sign = 0.
+        Q = polygon[-1]
+        for P in polygon:
+            ux, uy = P.x-Q.x, P.y-Q.y
+            cross = ux*(py-Q.y) - uy*(px-Q.x)
+            if abs(cross) > 1e-7 * sqrt(ux*ux + uy*uy):
+                if sign * cross < 0:
+                    return False
+                sign = cross
+            Q = P
+
+        return True
+
+    points = []
+    if polygon:
+        Q = polygon[-1]
+        for P in polygon:
+            points.append((P.x, P.y, True))
+
+            # where the side crosses the circles
+            ux, uy = P.x-Q.x, P.y-Q.y
+            a = ux*ux + uy*uy
+            if a > 0:
+                for cx, cy, r2 in circles:
+                    b = 2 * (ux*(Q.x-cx) + uy*(Q.y-cy))
+                    c = (Q.x-cx)*(Q.x-cx) + (Q.y-cy)*(Q.y-cy) - r2
+                    points.extend((Q.x + ux*t, Q.y + uy*t, True)
+                                  for t in quadratic(a, b, c) if 0 <= t <= 1)
+            Q = P
+
+        for k, (cx, cy, r2) in enumerate(circles):
+            # farthest point of the circle
+            r = sqrt(r2)
+            d = sqrt((cx-x)*(cx-x) + (cy-y)*(cy-y))
+            if d > 0:
+                points.append((cx + (cx-x)*r/d, cy + (cy-y)*r/d, False))
+            else:
+                points.append((cx + r, cy, False))
+
+            for ox, oy, o2 in circles[:k]:
+                if abs(ox-cx) + abs(oy-cy) > smol:
+                    points.extend((px, py, False) for px, py in
+                                  circle_inter_xy(cx, cy, r2, ox, oy, o2))
+
+    farthest = (0., x, y)
+    for px, py, on_polygon in points:
+        d2 = (px-x)*(px-x) + (py-y)*(py-y)
+        if d2 > farthest[0] and kept(px, py, on_polygon):
+            farthest = (d2, px, py)
+
+    d2, px, py = farthest
+    return sqrt(d2), px, py
+
+
+def circle_inter_line_xy(x0: float, y0: float, xu: float, yu: float,
+                         xc: float, yc: float, r2: float
+                         ) -> list[tuple[float, float]]:
+    """
+    same as circle_inter_line, for a line (x0, y0), (xu, yu) and a circle
+    (xc, yc, r2) given as floats
+    """
 
     # avoid divisions by zero by computing either x or y first
     # the calculations are nearly the same, only a few variable changes to do
@@ -259,5 +448,15 @@ def circle_inter_line(line: Line, circle: Circle) -> list[v2]:
 
     # find the full 2D positions of the solutions
     if x_first:
-        return [v2(y0 + (y-x0) / xu * yu, y) for y in solutions]
-    return [v2(x, y0 + (x-x0) / xu * yu) for x in solutions]
+        return [(y0 + (y-x0) / xu * yu, y) for y in solutions]
+    return [(x, y0 + (x-x0) / xu * yu) for x in solutions]
+
+
+def circle_inter_line(line: Line, circle: Circle) -> list[v2]:
+    """
+    Computes the list of intersections between a line and a circle
+    """
+
+    return [v2(x, y) for x, y in circle_inter_line_xy(
+        line.M.x, line.M.y, line.u.x, line.u.y,
+        circle.c.x, circle.c.y, circle.r2)]
@@ -0,0 +1,229 @@
+# Headless benchmark suite: times make_polygons over several families of
+# cells, stage by stage, and compares the results with a saved baseline.
+#
+# python bench_suite.py --output base.json           save a baseline
+# python bench_suite.py --baseline base.json         check for regressions
+#
+# bench_baseline.json holds the results of --quick on a reference machine,
+# along with its Python version. The counters can be compared anywhere and
+# must match exactly, so it is regenerated along with changes to the amount
+# of work done, but the times only mean something on the same machine:
+# regenerate it there first with
+# python bench_suite.py --quick --output bench_baseline.json
+
+import sys
+import json
+import platform
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+
+import importer
+from fast_voronoi import v2, Cell, Bounds, Options
+from fast_voronoi.polygons import make_polygons
+from fast_voronoi.classes.stats import Stats
+
+bounds = Bounds(0, 0, 1000, 1000)
+
+# cell counts for every kind of weights, the general algorithm used with
+# different weights being much slower
+sizes = {
+    'equal': [10, 100, 1000, 5000],
+    'heavy': [10, 50, 200],
+}
+quick_sizes = {
+    'equal': [10, 100, 1000],
+    'heavy': [10, 50],
+}
+
+# differences below this many seconds are considered noise
+noise = .005
+
+
+def uniform_positions(rnd: Random, n: int) -> list[v2]:
+    return [v2(rnd.uniform(1, 999), rnd.uniform(1, 999)) for _ in range(n)]
+
+
+def clustered_positions(rnd: Random, n: int) -> list[v2]:
+    centers = uniform_positions(rnd, max(n // 50, 2))
+    positions = []
+
+    for _ in range(n):
+        center = rnd.choice(centers)
+        x = min(max(rnd.gauss(center.x, 30), 1), 999)
+        y = min(max(rnd.gauss(center.y, 30), 1), 999)
+        positions.append(v2(x, y))
+
+    return positions
+
+
+def collinear_positions(rnd: Random, n: int) -> list[v2]:
+    # along the diagonal, slightly off the line so that no cells overlap
+    return [v2(1 + 998*t, 1 + 998*t + rnd.uniform(-.5, .5))
+            for t in sorted(rnd.random() for _ in range(n))]
+
+
+families = {
+    'uniform': uniform_positions,
+    'clustered': clustered_positions,
+    'collinear': collinear_positions,
+}
+
+
+def make_weights(rnd: Random, n: int, kind: str) -> list[float]:
+    if kind == 'equal':
+        return [1] * n
+
+    # Pareto distributed, a few cells being much lighter than the others
+    return [min(rnd.paretovariate(2), 20) for _ in range(n)]
+
+
+def make_cells(family: str, weights: str, n: int, seed: int) -> list[Cell]:
+    rnd = Random(f'{family}-{weights}-{n}-{seed}')
+
+    positions = families[family](rnd, n)
+    return [Cell(pos, w)
+            for pos, w in zip(positions, make_weights(rnd, n, weights))]
+
+
+def run_scenario(family: str, weights: str, n: int, seed: int, repeat: int
+                 ) -> dict:
+    cells = make_cells(family, weights, n, seed)
+
+    best = None
+    for _ in range(repeat):
+        stats = Stats()
+        options = Options(stats=stats)
+
+        t0 = perf_counter()
+        make_polygons(options, bounds, cells)
+        total = perf_counter() - t0
+
+        if best is None or total < best[0]:
+            best = total, stats
+
+    total, stats = best
+
+    return {
+        'name': f'{family}-{weights}-{n}',
+        'family': family,
+        'weights': weights,
+        'n': n,
+        'seed': seed,
+        'total': total,
+        'stages': dict(stats.times),
+        'counts': dict(stats.counts),
+    }
+
+
+def slower(before: float, now: float, tolerance: float) -> bool:
+    return now > before*(1+tolerance) and now - before > noise
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float
+            ) -> list[str]:
+    """
+    Prints how the results changed since the baseline, and returns the names
+    of the scenarios that got slower than allowed by the tolerance, in total
+    or in one of their stages, or whose counters changed
+    """
+
+    old = {scenario['name']: scenario for scenario in baseline}
+    regressions = []
+
+    print(f'{"scenario":<24} {"baseline":>10} {"now":>10} {"ratio":>7}',
+          file=sys.stderr)
+
+    for scenario in results:
+        before = old.get(scenario['name'])
+        if before is None:
+            continue
+
+        times = [(scenario['name'], before['total'], scenario['total'])]
+        times += [(f'  {stage}', before['stages'][stage], time)
+                  for stage, time in scenario['stages'].items()
+                  if stage in before['stages']]
+        failed = False
+
+        for label, old_time, time in times:
+            ratio = time / max(old_time, 1e-9)
+            late = slower(old_time, time, tolerance)
+            failed |= late
+
+            print(f'{label:<24} {old_time:>10.4f} {time:>10.4f} '
+                  f'{ratio:>7.2f}{"  REGRESSION" if late else ""}',
+                  file=sys.stderr)
+
+        # the counters do not depend on the machine, any change is reported
+        counts, old_counts = scenario['counts'], before['counts']
+        for key in sorted(counts.keys() | old_counts.keys()):
+            if counts.get(key) != old_counts.get(key):
+                failed = True
+                print(f'  {key} count: {old_counts.get(key)} -> '
+                      f'{counts.get(key)}  CHANGED', file=sys.stderr)
+
+        if failed:
+            regressions.append(scenario['name'])
+
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description='Headless make_polygons benchmark')
+    parser.add_argument('--quick', action='store_true',
+                        help='only run the smaller scenarios')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per scenario, the fastest one is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--families', nargs='+', choices=list(families),
+                        default=list(families))
+    parser.add_argument('--weights', nargs='+', choices=list(sizes),
+                        default=list(sizes))
+    parser.add_argument('--max-n', type=int, default=None,
+                        help='skip the scenarios with more cells')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=.25,
+                        help='allowed slowdown before reporting a regression')
+    args = parser.parse_args()
+
+    results = []
+    for weights in args.weights:
+        for n in (quick_sizes if args.quick else sizes)[weights]:
+            if args.max_n is not None and n > args.max_n:
+                continue
+
+            for family in args.families:
+                scenario = run_scenario(family, weights, n, args.seed,
+                                        args.repeat)
+                results.append(scenario)
+
+                print(f'{scenario["name"]:<24} {scenario["total"]:.4f}s',
+                      file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'scenarios': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['scenarios']
+
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} regression(s): '
+                  f'{", ".join(regressions)}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
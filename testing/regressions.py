@@ -0,0 +1,225 @@
+# Headless checks of inputs that broke the package at some point, run with
+# python regressions.py, which exits with an error when any of them fails.
+
+import os
+import sys
+import random
+import tempfile
+import traceback
+
+import importer
+from fast_voronoi import v2, Cell, Bounds, Options
+from fast_voronoi.polygons import make_polygons, iter_polygons, new_cache, \
+        build_cell
+from fast_voronoi.neighbors import is_neighbor, neighbor_candidates
+from fast_voronoi.classes.cell_grid import CellGrid
+from fast_voronoi.classes.stats import Stats
+from fast_voronoi.cache_file import topology_key, topology_path, \
+        load_topology
+from fast_voronoi.diagram import Diagram
+
+checks = []
+
+
+def check(function):
+    checks.append(function)
+    return function
+
+
+@check
+def edge_through_corner():
+    # the edge between the two last cells goes through the top right corner,
+    # which must still be kept apart from the edge intersection there
+    cells = [Cell(v2(200, 0), 2), Cell(v2(400, 100)), Cell(v2(300, 0))]
+    polygons = make_polygons(Options(), Bounds(0, 0, 400, 100), cells)
+
+    assert sorted(m for m, _ in polygons) == [0, 1, 2]
+
+
+def shapes(polygons: list[tuple[int, list[v2]]]) -> list:
+    # compares polygons regardless of their first point and rounding errors
+    return sorted((m, sorted({(round(x, 4), round(y, 4)) for x, y in polygon}))
+                  for m, polygon in polygons)
+
+
+@check
+def diagram_edits():
+    # random weighted edits of a diagram, compared with computing all the
+    # polygons again, including moves far away from the edited cell
+    bounds = Bounds(0, 0, 800, 600)
+
+    for seed in range(20):
+        rnd = random.Random(seed)
+
+        def cell() -> Cell:
+            return Cell(v2(rnd.uniform(1, 799), rnd.uniform(1, 599)),
+                        rnd.uniform(1, 3))
+
+        diagram = Diagram(Options(), bounds,
+                          [cell() for _ in range(rnd.randint(5, 40))])
+
+        for step in range(8):
+            edit = rnd.choice('mmmwir')
+            index = rnd.randrange(len(diagram.cells))
+
+            if edit == 'm':
+                diagram.move(index, cell().pos)
+            elif edit == 'w':
+                diagram.set_weight(index, cell().weight)
+            elif edit == 'i':
+                diagram.insert(cell())
+            else:
+                diagram.remove(index)
+
+            expected = make_polygons(Options(), bounds, diagram.cells)
+            assert shapes(diagram.get_polygons()) == shapes(expected), \
+                f'seed {seed}, step {step}'
+
+
+@check
+def interleaved_stats():
+    # measured calls running in turns must not count the work of each other,
+    # nor the one done by their caller between two polygons
+    rnd = random.Random(0)
+    bounds = Bounds(0, 0, 800, 600)
+    cells = [Cell(v2(rnd.uniform(1, 799), rnd.uniform(1, 599)),
+                  rnd.uniform(1, 3)) for _ in range(30)]
+
+    alone = Stats()
+    list(iter_polygons(Options(stats=alone), bounds, cells))
+
+    first, second = Stats(), Stats()
+    polygons1 = iter_polygons(Options(stats=first), bounds, cells)
+    polygons2 = iter_polygons(Options(stats=second), bounds, cells)
+
+    for _ in zip(polygons1, polygons2):
+        assert Stats.active is None
+        make_polygons(Options(), bounds, cells)
+
+    list(polygons1)
+    list(polygons2)
+
+    assert first.counts == second.counts == alone.counts
+
+
+@check
+def weighted_pruning():
+    # the reach radii of weighted cells leave out most of the pairs that
+    # cannot be neighbors, without leaving out any of the others
+    rnd = random.Random(0)
+    bounds = Bounds(0, 0, 1000, 1000)
+    cells = [Cell(v2(rnd.uniform(1, 999), rnd.uniform(1, 999)),
+                  rnd.uniform(1, 3)) for _ in range(120)]
+
+    candidates = neighbor_candidates(bounds, cells, CellGrid(cells))
+    kept = sum(map(len, candidates))
+    pairs = len(cells) * (len(cells)-1)
+    print(f'weighted_pruning: {kept} of {pairs} pairs kept '
+          f'({kept/pairs:.1%})', file=sys.stderr)
+
+    assert kept < pairs * .15
+    for i in range(len(cells)):
+        for j in range(len(cells)):
+            if i != j and j not in candidates[i]:
+                assert not is_neighbor(bounds, cells, i, j)
+
+
+@check
+def streamed_edges():
+    # the points of an edge are only kept until the cells on both of its
+    # sides are built, instead of until the last polygon
+    rnd = random.Random(0)
+    bounds = Bounds(0, 0, 1000, 1000)
+    cells = [Cell(v2(rnd.uniform(1, 999), rnd.uniform(1, 999)),
+                  rnd.uniform(1, 3)) for _ in range(200)]
+
+    stats = Stats()
+    cache = new_cache(Options(), bounds, cells)
+    order = sorted(range(len(cells)), key=lambda m: cells[m].weight)
+    largest = 0
+
+    with stats.call():
+        for _ in stats.run(build_cell(bounds, cache, m) for m in order):
+            largest = max(largest, len(cache.edge_cache))
+
+    # every edge between two cells is built once and used twice
+    assert stats.counts['edge_cache_hits'] > 0
+    assert largest < stats.counts['edge_cache_misses'] / 2
+    assert not cache.edge_cache
+
+
+@check
+def stopped_early():
+    # the shared memory of shards built by the workers but never read is
+    # still released when the caller stops iterating over the polygons
+    if not os.path.isdir('/dev/shm'):
+        return
+
+    rnd = random.Random(0)
+    cells = [Cell(v2(rnd.uniform(1, 999), rnd.uniform(1, 999)),
+                  rnd.uniform(1, 3)) for _ in range(60)]
+    before = set(os.listdir('/dev/shm'))
+
+    polygons = iter_polygons(Options(workers=2), Bounds(0, 0, 1000, 1000),
+                             cells)
+    next(polygons)
+    polygons.close()
+
+    assert set(os.listdir('/dev/shm')) <= before
+
+
+@check
+def broken_cache_files():
+    # unreadable files are computed again and replaced, and the directory is
+    # created when missing
+    rnd = random.Random(0)
+    bounds = Bounds(0, 0, 800, 600)
+    cells = [Cell(v2(rnd.uniform(1, 799), rnd.uniform(1, 599)),
+                  rnd.uniform(1, 3)) for _ in range(20)]
+    expected = shapes(make_polygons(Options(), bounds, cells))
+
+    with tempfile.TemporaryDirectory() as directory:
+        options = Options(cache_dir=os.path.join(directory, 'missing'))
+        key = topology_key(bounds, cells)
+        path = topology_path(options.cache_dir, key)
+
+        assert shapes(make_polygons(options, bounds, cells)) == expected
+        with open(path, 'rb') as file:
+            content = file.read()
+
+        for broken in (b'', content[:10], content[:-8],
+                       b'X' + content[1:]):
+            with open(path, 'wb') as file:
+                file.write(broken)
+
+            assert load_topology(path, key) is None
+            assert shapes(make_polygons(options, bounds, cells)) == expected
+            assert load_topology(path, key) is not None
+
+        # edits need their own copy of the data read from the file
+        diagram = Diagram(options, bounds, cells)
+        diagram.move(0, v2(400, 300))
+        assert shapes(diagram.get_polygons()) == shapes(
+            make_polygons(Options(), bounds, diagram.cells))
+
+
+def main():
+    failed = 0
+
+    for function in checks:
+        try:
+            function()
+        except Exception:
+            failed += 1
+            print(f'{function.__name__}: FAILED', file=sys.stderr)
+            traceback.print_exc()
+        else:
+            print(f'{function.__name__}: ok', file=sys.stderr)
+
+    if failed:
+        print(f'{failed} check(s) failed', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()